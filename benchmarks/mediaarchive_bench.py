@@ -0,0 +1,297 @@
+"""
+MediaArchive 扫描性能基准测试
+
+在临时目录中生成 电视剧/剧名/Season N 结构的模拟媒体库，以测试模式运行
+process_all_directories，统计耗时、峰值内存以及目录列举和 stat 调用次数，
+作为扫描相关改动的回归基准。
+
+MoviePilot 的 app.* 模块及 apscheduler / watchdog 均以桩模块代替，无需完整运行环境。
+每个规模在独立子进程中运行，保证峰值内存互不影响。
+
+用法：
+    python benchmarks/mediaarchive_bench.py
+    python benchmarks/mediaarchive_bench.py --sizes 1000,10000 --seasons 2 --files 12 --json
+
+剧集数量由文件数 / (季数 × 每季集数) 得出；每集另有一个 nfo 文件，用于覆盖非视频文件的跳过逻辑。
+"""
+import argparse
+import importlib.util
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+PLUGIN_DIR = ROOT / "plugins.v2" / "mediaarchive"
+DAY = 86400
+
+
+def install_stubs(data_path: Path):
+    """注册 app.* 等依赖的桩模块"""
+
+    def module(name: str, **attrs) -> types.ModuleType:
+        mod = types.ModuleType(name)
+        mod.__dict__.update(attrs)
+        sys.modules[name] = mod
+        return mod
+
+    class Settings:
+        TZ = "Asia/Shanghai"
+
+    class Logger:
+        def __getattr__(self, name):
+            return lambda *args, **kwargs: None
+
+    class PluginBase:
+        _data = {}
+
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def get_data(self, key):
+            return self._data.get(key)
+
+        def save_data(self, key, value):
+            self._data[key] = value
+
+        def get_data_path(self):
+            data_path.mkdir(parents=True, exist_ok=True)
+            return data_path
+
+        def update_config(self, config):
+            pass
+
+        def post_message(self, **kwargs):
+            pass
+
+    class StringUtils:
+        @staticmethod
+        def str_filesize(size, pre=2):
+            return f"{size}B"
+
+    class Dummy:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def __getattr__(self, name):
+            return lambda *args, **kwargs: None
+
+    for name in ("app", "app.core", "app.utils", "apscheduler", "apscheduler.schedulers",
+                 "apscheduler.triggers", "watchdog", "watchdog.observers", "fastapi"):
+        module(name)
+    module("app.core.config", settings=Settings())
+    module("app.core.event", eventmanager=Dummy(), Event=Dummy, EventType=Dummy())
+    module("app.log", logger=Logger())
+    module("app.schemas", NotificationType=Dummy())
+    module("app.utils.string", StringUtils=StringUtils)
+    module("app.utils.http", RequestUtils=Dummy)
+    module("app.helper")
+    module("app.helper.mediaserver", MediaServerHelper=Dummy)
+    module("app.plugins", _PluginBase=PluginBase).__path__ = []
+    module("apscheduler.schedulers.background", BackgroundScheduler=Dummy)
+    module("apscheduler.triggers.cron", CronTrigger=Dummy)
+    sys.modules["watchdog.observers"].Observer = Dummy
+    module("watchdog.observers.polling", PollingObserver=Dummy)
+    module("watchdog.events", FileSystemEventHandler=Dummy, FileSystemEvent=Dummy)
+    module("fastapi.responses", PlainTextResponse=Dummy)
+    module("pytz", timezone=Dummy)
+
+
+def load_plugin():
+    """以 app.plugins.mediaarchive 的包名加载插件"""
+    spec = importlib.util.spec_from_file_location(
+        "app.plugins.mediaarchive", PLUGIN_DIR / "__init__.py",
+        submodule_search_locations=[str(PLUGIN_DIR)])
+    mod = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = mod
+    spec.loader.exec_module(mod)
+    return mod.MediaArchive
+
+
+def generate_tree(root: Path, files: int, seasons: int, per_season: int,
+                  recent_ratio: float, old_days: int) -> int:
+    """
+    生成模拟媒体库，返回剧集数量
+    每集包含一个视频文件和一个 nfo 文件；recent_ratio 比例的剧集含最近修改的视频，
+    其余文件及所有目录的修改时间均为 old_days 天前
+    """
+    now = time.time()
+    old = now - old_days * DAY
+    shows = max(files // (seasons * per_season), 1)
+    recent_every = int(1 / recent_ratio) if recent_ratio > 0 else 0
+    for show in range(shows):
+        show_dir = root / "电视剧" / f"剧集{show:06d}"
+        for season in range(1, seasons + 1):
+            season_dir = show_dir / f"Season {season}"
+            season_dir.mkdir(parents=True)
+            for episode in range(1, per_season + 1):
+                for suffix in (".mkv", ".nfo"):
+                    path = season_dir / f"S{season:02d}E{episode:02d}{suffix}"
+                    path.touch()
+                    mtime = now if recent_every and show % recent_every == 0 else old
+                    os.utime(path, (mtime, mtime))
+    for dirpath, _, _ in os.walk(root, topdown=False):
+        os.utime(dirpath, (old, old))
+    return shows
+
+
+class Counters:
+    """统计目录列举和 stat 调用次数"""
+
+    def __init__(self):
+        self.scandir = 0
+        self.stat = 0
+
+    def install(self):
+        counters = self
+        real_scandir, real_stat = os.scandir, os.stat
+
+        class Entry:
+            __slots__ = ("_entry",)
+
+            def __init__(self, entry):
+                self._entry = entry
+
+            def __getattr__(self, name):
+                return getattr(self._entry, name)
+
+            def stat(self, *args, **kwargs):
+                counters.stat += 1
+                return self._entry.stat(*args, **kwargs)
+
+        class Scandir:
+            def __init__(self, path):
+                counters.scandir += 1
+                self._it = real_scandir(path)
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                self._it.close()
+
+            def __iter__(self):
+                return (Entry(entry) for entry in self._it)
+
+        def counting_stat(*args, **kwargs):
+            counters.stat += 1
+            return real_stat(*args, **kwargs)
+
+        os.scandir = Scandir
+        os.stat = counting_stat
+
+
+def run_once(plugin, count: bool) -> dict:
+    """运行一次 process_all_directories"""
+    counters = Counters()
+    real_scandir, real_stat = os.scandir, os.stat
+    if count:
+        counters.install()
+    try:
+        started = time.perf_counter()
+        plugin.process_all_directories()
+        elapsed = time.perf_counter() - started
+    finally:
+        os.scandir, os.stat = real_scandir, real_stat
+    result = {"seconds": round(elapsed, 3)}
+    if count:
+        result.update(scandir=counters.scandir, stat=counters.stat)
+    return result
+
+
+def bench(files: int, seasons: int, per_season: int, recent_ratio: float,
+          old_days: int, scan_cache: bool) -> dict:
+    """在当前进程中运行单个规模的基准测试"""
+    workdir = Path(tempfile.mkdtemp(prefix="mediaarchive-bench-"))
+    try:
+        source, target = workdir / "source", workdir / "target"
+        source.mkdir()
+        target.mkdir()
+        install_stubs(workdir / "data")
+        media_archive = load_plugin()
+
+        started = time.perf_counter()
+        shows = generate_tree(source, files, seasons, per_season, recent_ratio, old_days)
+        generate_seconds = time.perf_counter() - started
+
+        plugin = media_archive()
+        plugin.init_plugin({
+            "enabled": True,
+            "test_mode": True,
+            "cron": "",
+            "source_dir": str(source),
+            "target_dir": str(target),
+            "scan_cache": scan_cache,
+            "thresholds_str": "电视剧#10#90"
+        })
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # 冷启动（无缓存）与热启动（指纹缓存命中）各计时一次，再各统计一次调用次数
+        cold = run_once(plugin, count=False)
+        warm = run_once(plugin, count=False)
+        if scan_cache:
+            (workdir / "data" / "scan_cache.json").unlink(missing_ok=True)
+        cold.update({k: v for k, v in run_once(plugin, count=True).items() if k != "seconds"})
+        warm.update({k: v for k, v in run_once(plugin, count=True).items() if k != "seconds"})
+        return {
+            "files": shows * seasons * per_season,
+            "shows": shows,
+            "candidates": shows * seasons,
+            "generate_seconds": round(generate_seconds, 2),
+            "cold": cold,
+            "warm": warm,
+            # Linux 下 ru_maxrss 单位为 KB
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "rss_growth_mb": round((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024, 1)
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000", help="视频文件数量，逗号分隔")
+    parser.add_argument("--seasons", type=int, default=2, help="每部剧的季数")
+    parser.add_argument("--files", type=int, default=12, help="每季的集数")
+    parser.add_argument("--recent-ratio", type=float, default=0.1, help="含最近修改视频的剧集比例")
+    parser.add_argument("--old-days", type=int, default=365, help="其余文件和目录的修改时间（天前）")
+    parser.add_argument("--no-cache", action="store_true", help="关闭目录指纹缓存")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(bench(args.single, args.seasons, args.files, args.recent_ratio,
+                               args.old_days, not args.no_cache)))
+        return
+
+    results = []
+    for size in (int(size) for size in args.sizes.split(",") if size.strip()):
+        cmd = [sys.executable, __file__, "--single", str(size), "--seasons", str(args.seasons),
+               "--files", str(args.files), "--recent-ratio", str(args.recent_ratio),
+               "--old-days", str(args.old_days)]
+        if args.no_cache:
+            cmd.append("--no-cache")
+        output = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+
+    header = f"{'文件数':>8} {'候选目录':>8} {'冷启动(s)':>10} {'scandir':>8} {'stat':>8} " \
+             f"{'热启动(s)':>10} {'scandir':>8} {'stat':>8} {'峰值RSS(MB)':>12}"
+    print(header)
+    for r in results:
+        print(f"{r['files']:>8} {r['candidates']:>8} {r['cold']['seconds']:>10} {r['cold']['scandir']:>8} "
+              f"{r['cold']['stat']:>8} {r['warm']['seconds']:>10} {r['warm']['scandir']:>8} "
+              f"{r['warm']['stat']:>8} {r['peak_rss_mb']:>12}")
+
+
+if __name__ == "__main__":
+    main()
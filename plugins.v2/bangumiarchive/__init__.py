@@ -23,15 +23,21 @@ from apscheduler.triggers.cron import CronTrigger
 from app.schemas import NotificationType
 import pytz
 from datetime import timedelta
-import time
 import re
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from app.plugins.bangumiarchive.history import TransferHistoryStore
+from app.plugins.bangumiarchive.idcache import TmdbIdCache, nfo_fingerprint
+from app.plugins.bangumiarchive.ratelimit import RateLimiter
+from app.plugins.bangumiarchive.retry import CircuitOpenError, NotFoundError, RetryPolicy
+from app.plugins.bangumiarchive.statuscache import MediaStatusCache
 
 class BangumiArchive(_PluginBase):
     # 插件基础信息
     plugin_name = "连载番剧归档"
     plugin_desc = "自动检测连载目录中的番剧，识别完结情况并归档到完结目录"
-    plugin_version = "1.7"
+    plugin_version = "2.2"
     plugin_icon = "emby.png"
     plugin_author = "Sebastian0619"
     author_url = "https://github.com/sebastian0619"
@@ -48,6 +54,8 @@ class BangumiArchive(_PluginBase):
     _notify = False
     _bidirectional = False
     _end_after_days = 730  # 默认730天(2年)
+    _resolve_concurrency = 8  # 同时识别的目录数
+    _tmdb_rate = 30  # 每秒最多请求TMDB次数，0为不限制
 
     # 状态常量定义
     END_STATUS = {"Ended", "Canceled"}
@@ -64,12 +72,23 @@ class BangumiArchive(_PluginBase):
     meta_helper = None
     mediachain = None
     _scheduler = None
+    # TMDB ID 缓存
+    _id_cache: Optional[TmdbIdCache] = None
+    # 媒体状态缓存
+    _status_cache: Optional[MediaStatusCache] = None
+    # 识别线程共用的请求限速器
+    _limiter: Optional[RateLimiter] = None
+    # TMDB请求共用的重试策略和熔断器
+    _retry: Optional[RetryPolicy] = None
+    # 转移历史及TMDB ID索引
+    _history: Optional[TransferHistoryStore] = None
     _last_check_time = {}  # 用于记录每个媒体的最后检查时间
     # 用于收集通知信息
     _transfer_messages = {
         "airing_to_end": [],    # 连载->完结
         "end_to_airing": [],    # 完结->连载
-        "failed": []           # 处理失败
+        "failed": [],          # 处理失败
+        "degraded": []         # TMDB不可用，使用缓存状态
     }
 
     def __init__(self, *args, **kwargs):
@@ -84,6 +103,9 @@ class BangumiArchive(_PluginBase):
         try:
             self.meta_helper = ModuleHelper()
             self.mediachain = MediaChain()
+            self._id_cache = TmdbIdCache(self.get_data_path() / "tmdb_ids.json")
+            self._status_cache = MediaStatusCache(self.get_data_path() / "media_status.json")
+            self._history = TransferHistoryStore(self.get_data, self.save_data)
             
             if config:
                 self._enabled = config.get("enabled")
@@ -95,30 +117,42 @@ class BangumiArchive(_PluginBase):
                 self._bidirectional = config.get("bidirectional")
                 # 添加新配置项，如果未配置则使用默认值
                 self._end_after_days = int(config.get("end_after_days", 730))
-                
-                # 如果开启立即运行
-                if self._enabled and self._onlyonce:
-                    logger.info(f"番剧归档服务启动，立即运行一次...")
-                    # 行一次任务
-                    self.check_and_move()
-                    # 关闭一次性开关
-                    self._onlyonce = False
-                    self.__update_config()
-                
-                # 周期运行
-                if self._enabled and self._cron:
-                    try:
-                        self._scheduler = BackgroundScheduler(timezone=settings.TZ)
-                        self._scheduler.add_job(func=self.check_and_move,
-                                              trigger=CronTrigger.from_crontab(self._cron),
-                                              name="番剧归档")
-                        if self._scheduler.get_jobs():
-                            self._scheduler.print_jobs()
-                            self._scheduler.start()
-                            logger.info(f"周期任务已启动，执行周期：{self._cron}")
-                    except Exception as err:
-                        logger.error(f"周期任务启动失败：{str(err)}")
+                try:
+                    self._resolve_concurrency = max(int(config.get("resolve_concurrency") or 8), 1)
+                except (TypeError, ValueError):
+                    self._resolve_concurrency = 8
+                try:
+                    self._tmdb_rate = max(float(config.get("tmdb_rate", 30)), 0)
+                except (TypeError, ValueError):
+                    self._tmdb_rate = 30
+
+            # 在立即运行和周期任务之前创建，运行时需要使用
+            self._limiter = RateLimiter(self._tmdb_rate)
+            self._retry = RetryPolicy()
+
+            # 如果开启立即运行
+            if self._enabled and self._onlyonce:
+                logger.info(f"番剧归档服务启动，立即运行一次...")
+                # 行一次任务
+                self.check_and_move()
+                # 关闭一次性开关
+                self._onlyonce = False
+                self.__update_config()
             
+            # 周期运行
+            if self._enabled and self._cron:
+                try:
+                    self._scheduler = BackgroundScheduler(timezone=settings.TZ)
+                    self._scheduler.add_job(func=self.check_and_move,
+                                          trigger=CronTrigger.from_crontab(self._cron),
+                                          name="番剧归档")
+                    if self._scheduler.get_jobs():
+                        self._scheduler.print_jobs()
+                        self._scheduler.start()
+                        logger.info(f"周期任务已启动，执行周期：{self._cron}")
+                except Exception as err:
+                    logger.error(f"周期任务启动失败：{str(err)}")
+
             # 验证历史记录格式
             self.__verify_history_format()
         except Exception as e:
@@ -232,6 +266,45 @@ class BangumiArchive(_PluginBase):
                             }
                         ]
                     },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 6
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'resolve_concurrency',
+                                            'label': '识别并发数',
+                                            'placeholder': '同时识别的目录数，默认8'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 6
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'tmdb_rate',
+                                            'label': 'TMDB每秒请求数',
+                                            'placeholder': '所有识别线程合计，默认30，0为不限制'
+                                        }
+                                    }
+                                ]
+                            }
+                        ]
+                    },
                     {
                         'component': 'VRow',
                         'content': [
@@ -285,7 +358,9 @@ class BangumiArchive(_PluginBase):
             'bidirectional': False,
             'cron': '5 1 * * *',
             'paths': '',
-            'end_after_days': 730
+            'end_after_days': 730,
+            'resolve_concurrency': 8,
+            'tmdb_rate': 30
         }
 
     def __send_notification(self):
@@ -314,6 +389,19 @@ class BangumiArchive(_PluginBase):
                 for msg in self._transfer_messages["end_to_airing"]:
                     message_lines.append(msg)
                 
+            # TMDB不可用时的降级说明
+            if self._transfer_messages["degraded"] or self._retry.trips:
+                has_content = True
+                if message_lines:
+                    message_lines.append("")
+                message_lines.append("【TMDB不可用】")
+                message_lines.append(f"请求连续失败熔断 {self._retry.trips} 次，跳过请求 {self._retry.rejected} 次，"
+                                     f"{len(self._transfer_messages['degraded'])} 个剧集使用缓存状态")
+                # 熔断时几乎所有剧集都使用缓存，只列出前10个
+                message_lines.extend(self._transfer_messages["degraded"][:10])
+                if len(self._transfer_messages["degraded"]) > 10:
+                    message_lines.append("...")
+
             # 添加处理失败的记录
             if self._transfer_messages["failed"]:
                 has_content = True
@@ -347,72 +435,65 @@ class BangumiArchive(_PluginBase):
         """
         检查媒体状态
         """
-        MAX_RETRIES = 3
-        RETRY_DELAY = 5
+        def recognize():
+            # 使用 mediachain 通过路径识别媒体信息
+            self._limiter.acquire()
+            context = self.mediachain.recognize_by_path(path)
+            if not context or not context.media_info:
+                raise NotFoundError(f"无法获取媒体信息: {path}")
+            return context.media_info
+
+        try:
+            media_info = self._retry.call(recognize)
+        except CircuitOpenError as e:
+            logger.warning(f"{str(e)}，跳过状态检查: {path}")
+            return False, "unknown"
+        except NotFoundError as e:
+            logger.warning(str(e))
+            return False, "unknown"
+        except Exception as e:
+            logger.error(f"多次尝试后仍然失败: {str(e)}")
+            logger.error(f"错误详情: {traceback.format_exc()}")
+            return False, "unknown"
+
+        # 验证TMDB ID是否匹配
+        if media_info.tmdb_id != tmdb_id:
+            logger.error(f"TMDB ID不匹配: 期望 {tmdb_id}, 实际 {media_info.tmdb_id}")
+            return False, "unknown"
         
-        for attempt in range(MAX_RETRIES):
-            try:
-                # 使用 mediachain 通过路径识别媒体信息
-                context = self.mediachain.recognize_by_path(path)
-                if not context or not context.media_info:
-                    if attempt < MAX_RETRIES - 1:
-                        logger.warning(f"第 {attempt + 1} 次获取媒体信息失败，{RETRY_DELAY}秒后重试...")
-                        time.sleep(RETRY_DELAY)
-                        continue
-                    else:
-                        logger.error(f"在 {MAX_RETRIES} 次尝试后仍无法获取媒体信息: {path}")
-                        return False, "unknown"
-                
-                media_info = context.media_info
-                
-                # 验证TMDB ID是否匹配
-                if media_info.tmdb_id != tmdb_id:
-                    logger.error(f"TMDB ID不匹配: 期望 {tmdb_id}, 实际 {media_info.tmdb_id}")
-                    return False, "unknown"
-                
-                # 获取关键信息
-                name = media_info.title
-                status = media_info.status
-                first_air_date = media_info.air_date
-                last_air_date = media_info.last_air_date
-                
-                if not status or not last_air_date:
-                    logger.error(f"媒体信息不完整: {path}")
-                    return False, "unknown"
-                    
-                # 计算距今天数
-                try:
-                    last_date = datetime.strptime(last_air_date, '%Y-%m-%d')
-                    today = datetime.now()
-                    days_diff = (today - last_date).days
-                    
-                    # 只输出一次日志
-                    logger.info(f"媒体信息: {name} ({first_air_date[:4] if first_air_date else '未知'})")
-                    logger.info(f"当前状态: {status}")
-                    logger.info(f"最后播出日期: {last_air_date}")
-                    logger.info(f"距今已过: {days_diff}天")
-                    logger.info(f"完结判定阈值: {self._end_after_days}天")
-                    
-                    if days_diff > self._end_after_days:
-                        logger.info(f"超过{self._end_after_days}天未更新，视为完结")
-                        return True, f"最后播出超过{self._end_after_days}天 ({last_air_date})"
-                    else:
-                        logger.info(f"未超过{self._end_after_days}天，视为连载中")
-                        return False, status
-                    
-                except ValueError as e:
-                    logger.error(f"日期解析错误: {str(e)}")
-                    return False, status
-                    
-            except Exception as e:
-                if attempt < MAX_RETRIES - 1:
-                    logger.warning(f"第 {attempt + 1} 次请求失败: {str(e)}，{RETRY_DELAY}秒后重试...")
-                    time.sleep(RETRY_DELAY)
-                    continue
-                else:
-                    logger.error(f"在 {MAX_RETRIES} 次尝试后仍然失败: {str(e)}")
-                    logger.error(f"错误详情: {traceback.format_exc()}")
-                    return False, "unknown"
+        # 获取关键信息
+        name = media_info.title
+        status = media_info.status
+        first_air_date = media_info.air_date
+        last_air_date = media_info.last_air_date
+        
+        if not status or not last_air_date:
+            logger.error(f"媒体信息不完整: {path}")
+            return False, "unknown"
+            
+        # 计算距今天数
+        try:
+            last_date = datetime.strptime(last_air_date, '%Y-%m-%d')
+            today = datetime.now()
+            days_diff = (today - last_date).days
+            
+            # 只输出一次日志
+            logger.info(f"媒体信息: {name} ({first_air_date[:4] if first_air_date else '未知'})")
+            logger.info(f"当前状态: {status}")
+            logger.info(f"最后播出日期: {last_air_date}")
+            logger.info(f"距今已过: {days_diff}天")
+            logger.info(f"完结判定阈值: {self._end_after_days}天")
+            
+            if days_diff > self._end_after_days:
+                logger.info(f"超过{self._end_after_days}天未更新，视为完结")
+                return True, f"最后播出超过{self._end_after_days}天 ({last_air_date})"
+            else:
+                logger.info(f"未超过{self._end_after_days}天，视为连载中")
+                return False, status
+            
+        except ValueError as e:
+            logger.error(f"日期解析错误: {str(e)}")
+            return False, status
 
     def __transfer_media(self, source: str, target: str, tmdb_id: int, old_status: str, new_status: str):
         """
@@ -425,6 +506,7 @@ class BangumiArchive(_PluginBase):
                 # 移动文件
                 shutil.move(source, target)
                 logger.info(f"已移动: {source} -> {target}")
+                self._id_cache.move(source, target)
                 
                 # 保存转移历史
                 history = {
@@ -438,16 +520,8 @@ class BangumiArchive(_PluginBase):
                     "transfer_type": "airing_to_end" if old_status == "Returning Series" else "end_to_airing"
                 }
                 
-                # 获取现有历史记录
-                histories = self.get_data('transfer_history') or []
-                if not isinstance(histories, list):
-                    histories = [histories]
-                    
-                # 添加新记录
-                histories.append(history)
-                
-                # 保存更新后的历史记录
-                self.save_data('transfer_history', histories)
+                # 保存历史记录并更新索引
+                self._history.append(history)
                 logger.info(f"已写入历史记录: {os.path.basename(source)} - {history['transfer_type']}")
                 
                 # 添加到通知消息
@@ -518,16 +592,7 @@ class BangumiArchive(_PluginBase):
         获取最近一次移动记录
         """
         try:
-            histories = self.get_data("history") or []
-            if not isinstance(histories, list):
-                histories = [histories]
-                
-            # 按时间倒序过滤指定tmdb_id的记录
-            media_histories = [h for h in histories if h.get("tmdb_id") == tmdb_id]
-            if media_histories:
-                return sorted(media_histories, 
-                            key=lambda x: datetime.strptime(x.get("create_time"), "%Y-%m-%d %H:%M:%S"),
-                            reverse=True)[0]
+            return self._history.latest(tmdb_id)
         except Exception as e:
             logger.error(f"获取历史记录失败: {str(e)}")
         return None
@@ -561,9 +626,10 @@ class BangumiArchive(_PluginBase):
         return False
 
     def __process_directory(self, source_dir: str, target_dir: str, check_ended: bool, processed_paths: set):
-        """处理目录"""
+        """处理目录：先并发识别所有子目录，再按目录名顺序依次判断和移动"""
         try:
-            for item in os.listdir(source_dir):
+            items = []
+            for item in sorted(os.listdir(source_dir)):
                 item_path = os.path.normpath(os.path.join(source_dir, item))
                 
                 # 跳过已处理的路径
@@ -573,14 +639,18 @@ class BangumiArchive(_PluginBase):
                 if not os.path.isdir(item_path):
                     continue
 
-                # 获取媒体信息
-                tmdb_id = self.__get_tmdb_id(item_path)
+                items.append((item, item_path))
+
+            # 并发识别TMDB ID和媒体信息，结果按目录顺序返回
+            with ThreadPoolExecutor(max_workers=self._resolve_concurrency,
+                                    thread_name_prefix="bangumiarchive-resolve") as executor:
+                resolved = list(executor.map(self.__resolve_media, [item_path for _, item_path in items]))
+
+            for (item, item_path), (tmdb_id, media_info) in zip(items, resolved):
                 if not tmdb_id:
                     self._transfer_messages["failed"].append(f"《{item}》: 无法获取TMDB ID")
                     continue
 
-                # 一次性获取所有媒体信息
-                media_info = self._get_media_info(tmdb_id)
                 if not media_info:
                     self._transfer_messages["failed"].append(f"《{item}》: 无法识别媒体信息")
                     continue
@@ -609,13 +679,40 @@ class BangumiArchive(_PluginBase):
         except Exception as e:
             logger.error(f"处理目录出错: {str(e)}")
 
+    def __resolve_media(self, path: str) -> Tuple[Optional[int], Optional[dict]]:
+        """
+        识别目录的TMDB ID和媒体状态，在识别线程中运行
+        """
+        try:
+            tmdb_id = self.__get_tmdb_id(path)
+            if not tmdb_id:
+                return None, None
+            return tmdb_id, self.__get_media_status(tmdb_id)
+        except Exception as e:
+            logger.error(f"识别媒体出错: {path} - {str(e)}")
+            return None, None
+
     def __get_tmdb_id(self, path: str) -> Optional[int]:
         """
-        获取TMDB ID
+        获取TMDB ID，tvshow.nfo 未变化时使用缓存的识别结果
+        """
+        nfo_path = os.path.join(path, "tvshow.nfo")
+        fingerprint = nfo_fingerprint(nfo_path)
+        tmdb_id = self._id_cache.lookup(path, fingerprint)
+        if tmdb_id:
+            logger.debug(f"使用缓存的TMDB ID: {tmdb_id}")
+            return tmdb_id
+        tmdb_id, method = self.__resolve_tmdb_id(path, nfo_path)
+        if tmdb_id:
+            self._id_cache.store(path, fingerprint, tmdb_id, method)
+        return tmdb_id
+
+    def __resolve_tmdb_id(self, path: str, nfo_path: str) -> Tuple[Optional[int], Optional[str]]:
+        """
+        识别TMDB ID，返回 (TMDB ID, 识别方式)
         """
         try:
             # 1. 首先尝试从 nfo 文件获取
-            nfo_path = os.path.join(path, "tvshow.nfo")
             if os.path.exists(nfo_path):
                 with open(nfo_path, 'r', encoding='utf-8') as f:
                     content = f.read()
@@ -624,7 +721,7 @@ class BangumiArchive(_PluginBase):
                     if match:
                         tmdb_id = int(match.group(1))
                         logger.debug(f"从tvshow.nfo获取到TMDB ID: {tmdb_id}")
-                        return tmdb_id
+                        return tmdb_id, "nfo"
 
             # 2. 如果 nfo 文件不存在或无法获取ID，尝试从目录名称识别
             media_name = os.path.basename(path)
@@ -647,29 +744,31 @@ class BangumiArchive(_PluginBase):
                     meta.year = year
                 
                 # 使用 mediachain 的 recognize_by_meta 方法
+                self._limiter.acquire()
                 media_info = self.mediachain.recognize_by_meta(meta)
                 if media_info:
                     tmdb_id = media_info.tmdb_id
                     if tmdb_id:
                         logger.debug(f"从目录名称识别到TMDB ID: {tmdb_id}")
-                        return tmdb_id
+                        return tmdb_id, "meta"
                 
                 # 如果第一次识别失败，尝试使用 mediachain 的 recognize_by_path 方法
                 if not media_info:
                     logger.info(f"尝试使用路径识别: {path}")
+                    self._limiter.acquire()
                     context = self.mediachain.recognize_by_path(path)
                     if context and context.media_info:
                         tmdb_id = context.media_info.tmdb_id
                         if tmdb_id:
                             logger.debug(f"从路径识别到TMDB ID: {tmdb_id}")
-                            return tmdb_id
+                            return tmdb_id, "path"
                 
             logger.warning(f"无法识别媒体: {media_name}")
-            return None
+            return None, None
             
         except Exception as e:
             logger.error(f"获取TMDB ID失败: {str(e)}")
-            return None
+            return None, None
 
     def __get_last_status(self, tmdb_id: int) -> str:
         """
@@ -685,59 +784,89 @@ class BangumiArchive(_PluginBase):
             logger.error(f"获取最近状态失败: {str(e)}")
             return "unknown"
 
+    def __get_media_status(self, tmdb_id: int) -> Optional[dict]:
+        """
+        获取媒体状态（名称、状态、最后播出日期、下一集播出日期），优先使用未过期的缓存
+        """
+        cached = self._status_cache.get(tmdb_id)
+        if cached:
+            logger.debug(f"使用缓存的媒体状态: {cached.get('name')} ({cached.get('status')})")
+            return cached
+
+        media_info = self._get_media_info(tmdb_id)
+        if not media_info:
+            # TMDB不可用时使用过期的缓存状态，本次运行标记为降级
+            stale = self._status_cache.get(tmdb_id, allow_stale=True)
+            if stale:
+                self._transfer_messages["degraded"].append(
+                    f"《{stale.get('name') or tmdb_id}》: 使用缓存状态 ({self.STATUS_MAPPING.get(stale.get('status'), stale.get('status'))})"
+                )
+            return stale
+
+        def field(key: str, attr: str = None):
+            if isinstance(media_info, dict):
+                return media_info.get(key)
+            return getattr(media_info, attr or key, None)
+
+        next_episode = field("next_episode_to_air") or {}
+        return self._status_cache.put(
+            tmdb_id,
+            name=field("name", "title"),
+            status=field("status"),
+            last_air_date=field("last_air_date"),
+            next_air_date=next_episode.get("air_date") if isinstance(next_episode, dict) else None
+        )
+
     def _get_media_info(self, tmdb_id: int, path: str = None, retry_count: int = 3) -> Optional[Dict]:
         """
-        获取媒体详细信息
+        获取媒体详细信息，请求出错时按共用的重试策略退避重试，熔断期间直接返回；查不到媒体信息时不重试
         @param tmdb_id: TMDB ID
         @param path: 媒体路径
-        @param retry_count: 重试次数
+        @param retry_count: 最多尝试次数
         @return: 媒体信息字典
         """
-        for i in range(retry_count):
-            try:
-                media_info = None
-                
-                # 方案1: 如果提供了路径,优先使用路径识别
-                if path:
-                    context = self.mediachain.recognize_by_path(path)
-                    if context and context.media_info:
-                        media_info = context.media_info
-                
-                # 方案2: 如果路径识别失败或未提供路径,使用TMDB API
-                if not media_info:
-                    try:
-                        from app.modules.themoviedb.tmdbapi import TmdbApi
-                        tmdb_api = TmdbApi()
-                        media_info = tmdb_api.get_info(mtype=MediaType.TV, tmdbid=tmdb_id)
-                    except Exception as e:
-                        logger.error(f"TMDB API调用失败: {str(e)}")
-                        if i < retry_count - 1:
-                            continue
-                
-                if media_info:
-                    # 记录关键信息
-                    name = media_info.title if hasattr(media_info, 'title') else media_info.get('name')
-                    year = (media_info.air_date if hasattr(media_info, 'air_date') else media_info.get('first_air_date', ''))[:4]
-                    status = media_info.status if hasattr(media_info, 'status') else media_info.get('status')
-                    last_air_date = media_info.last_air_date if hasattr(media_info, 'last_air_date') else media_info.get('last_air_date')
-                    
-                    logger.info(f"媒体信息: {name} ({year})")
-                    logger.info(f"当前状态: {status}")
-                    
-                    return media_info
-                
-                if i < retry_count - 1:
-                    logger.warning(f"第 {i + 1} 次获取媒体信息失败，准备重试...")
-                    time.sleep(5)  # 添加重试延迟
-                    
-            except Exception as e:
-                logger.error(f"获取媒体信息出错: {str(e)}")
-                logger.error(f"错误详情: {traceback.format_exc()}")
-                if i < retry_count - 1:
-                    time.sleep(5)  # 添加重试延迟
-                    continue
-                    
-        return None
+        def fetch():
+            media_info = None
+
+            # 方案1: 如果提供了路径,优先使用路径识别
+            if path:
+                self._limiter.acquire()
+                context = self.mediachain.recognize_by_path(path)
+                if context and context.media_info:
+                    media_info = context.media_info
+
+            # 方案2: 如果路径识别失败或未提供路径,使用TMDB API
+            if not media_info:
+                from app.modules.themoviedb.tmdbapi import TmdbApi
+                tmdb_api = TmdbApi()
+                self._limiter.acquire()
+                media_info = tmdb_api.get_info(mtype=MediaType.TV, tmdbid=tmdb_id)
+
+            if not media_info:
+                raise NotFoundError(f"未获取到媒体信息: {tmdb_id}")
+            return media_info
+
+        try:
+            media_info = self._retry.call(fetch, attempts=retry_count)
+        except CircuitOpenError as e:
+            logger.debug(f"{str(e)}，跳过获取媒体信息: {tmdb_id}")
+            return None
+        except NotFoundError as e:
+            logger.warning(str(e))
+            return None
+        except Exception as e:
+            logger.error(f"获取媒体信息出错: {str(e)}")
+            return None
+
+        # 记录关键信息
+        name = media_info.title if hasattr(media_info, 'title') else media_info.get('name')
+        year = (media_info.air_date if hasattr(media_info, 'air_date') else media_info.get('first_air_date', ''))[:4]
+        status = media_info.status if hasattr(media_info, 'status') else media_info.get('status')
+
+        logger.info(f"媒体信息: {name} ({year})")
+        logger.info(f"当前状态: {status}")
+
+        return media_info
 
     def __check_if_ended(self, status: str, last_air_date: str) -> bool:
         """检查是否已完结"""
@@ -772,9 +901,17 @@ class BangumiArchive(_PluginBase):
             self._transfer_messages = {
                 "airing_to_end": [],
                 "end_to_airing": [],
-                "failed": []
+                "failed": [],
+                "degraded": []
             }
+            # 每次运行重新尝试请求TMDB
+            self._retry.reset()
             
+            # 加载TMDB ID和媒体状态缓存、转移历史
+            self._id_cache.load()
+            self._status_cache.load()
+            self._history.load()
+
             # 解析目录映射
             path_list = []
             processed_paths = set()  # 记录已处理的路径
@@ -813,6 +950,10 @@ class BangumiArchive(_PluginBase):
                         processed_paths=processed_paths
                     )
                     
+            if self._retry.trips:
+                logger.warning(f"本次运行TMDB不可用，跳过请求 {self._retry.rejected} 次，"
+                               f"{len(self._transfer_messages['degraded'])} 个剧集使用缓存状态")
+
             # 处理完成后发送通知
             self.__send_notification()
                     
@@ -824,6 +965,9 @@ class BangumiArchive(_PluginBase):
                     title="【番剧归档处理失败】",
                     text=f"检查过程出错：{str(e)}"
                 )
+        finally:
+            self._id_cache.save()
+            self._status_cache.save()
 
     def get_state(self) -> bool:
         return self._enabled
@@ -846,7 +990,9 @@ class BangumiArchive(_PluginBase):
             "bidirectional": self._bidirectional,
             "cron": self._cron,
             "paths": self._paths,
-            "end_after_days": self._end_after_days  # 添加新配置项
+            "end_after_days": self._end_after_days,  # 添加新配置项
+            "resolve_concurrency": self._resolve_concurrency,
+            "tmdb_rate": self._tmdb_rate
         })
 
     def get_page(self) -> List[dict]:
@@ -854,7 +1000,7 @@ class BangumiArchive(_PluginBase):
         插件页面 - 显示归档处理历史记录
         """
         # 获取历史数据
-        transfer_histories = self.get_data('transfer_history') or []
+        transfer_histories = self.get_data(TransferHistoryStore.KEY) or []
         failed_histories = self.get_data('failed_history') or []
 
         return [
@@ -1219,7 +1365,7 @@ class BangumiArchive(_PluginBase):
         """
         try:
             # 验证转移历史
-            transfer_histories = self.get_data('transfer_history') or []
+            transfer_histories = self.get_data(TransferHistoryStore.KEY) or []
             if transfer_histories:
                 for history in transfer_histories:
                     required_fields = ['create_time', 'media_name', 'transfer_type', 'old_status', 'new_status']
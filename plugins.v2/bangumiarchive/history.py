@@ -0,0 +1,68 @@
+"""
+转移历史
+历史记录统一保存在 transfer_history 中，加载时建立 TMDB ID 到最近一条记录的索引，
+写入时同步更新索引，判断是否需要移动时不再遍历和排序整个历史
+"""
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from app.log import logger
+
+
+class TransferHistoryStore:
+    """转移历史，可被多个线程同时使用"""
+    # 历史记录的存储键
+    KEY = "transfer_history"
+    # 旧版本读取历史时使用的键，加载时合并到 KEY 中
+    LEGACY_KEY = "history"
+
+    def __init__(self, get_data: Callable[[str], Any], save_data: Callable[[str, Any], None]):
+        self._get_data = get_data
+        self._save_data = save_data
+        self._lock = threading.Lock()
+        self._records: List[dict] = []
+        # TMDB ID -> 最近一条记录
+        self._latest: Dict[str, dict] = {}
+
+    def load(self):
+        """读取历史记录并建立索引"""
+        records = self.__read(self.KEY)
+        legacy = self.__read(self.LEGACY_KEY)
+        if legacy:
+            logger.info(f"合并旧版历史记录 {len(legacy)} 条")
+            records = sorted(records + legacy, key=lambda x: x.get("create_time") or "")
+            self._save_data(self.KEY, records)
+            self._save_data(self.LEGACY_KEY, [])
+        with self._lock:
+            self._records = records
+            self._latest = {}
+            for record in records:
+                self.__index(record)
+
+    def latest(self, tmdb_id: int) -> Optional[dict]:
+        """TMDB ID 最近一条记录"""
+        with self._lock:
+            return self._latest.get(str(tmdb_id))
+
+    def append(self, record: dict):
+        """写入一条记录"""
+        with self._lock:
+            self._records.append(record)
+            self.__index(record)
+            records = list(self._records)
+        self._save_data(self.KEY, records)
+
+    def __read(self, key: str) -> List[dict]:
+        records = self._get_data(key) or []
+        if not isinstance(records, list):
+            records = [records]
+        return [record for record in records if isinstance(record, dict)]
+
+    def __index(self, record: dict):
+        tmdb_id = record.get("tmdb_id")
+        if tmdb_id is None:
+            return
+        current = self._latest.get(str(tmdb_id))
+        # 时间格式为 %Y-%m-%d %H:%M:%S，可直接按字符串比较；时间相同时以后写入的为准
+        if not current or (record.get("create_time") or "") >= (current.get("create_time") or ""):
+            self._latest[str(tmdb_id)] = record
@@ -0,0 +1,109 @@
+"""
+TMDB ID 缓存
+以标准化的目录路径为键，记录 tvshow.nfo 的修改时间和大小及识别到的 TMDB ID，
+NFO 未变化（或仍不存在）时直接使用缓存，不再读取 NFO 或联网识别；目录改名后路径变化，自然重新识别
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from app.log import logger
+
+# NFO 指纹：(修改时间 ns, 大小)，NFO 不存在时为 None
+NfoFingerprint = Optional[Tuple[int, int]]
+
+
+def nfo_fingerprint(nfo_path: str) -> NfoFingerprint:
+    """获取 NFO 文件指纹，文件不存在时返回 None"""
+    try:
+        stat = os.stat(nfo_path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class TmdbIdCache:
+    """TMDB ID 缓存，可被多个线程同时使用"""
+    VERSION = 1
+    # 超过该天数未使用的条目（目录已删除或改名）在保存时清理
+    MAX_IDLE_DAYS = 30
+
+    def __init__(self, path: Path):
+        self._path = Path(path)
+        # 目录路径 -> [NFO 修改时间 ns, NFO 大小, TMDB ID, 识别方式, 最近使用时间]
+        self._entries: Dict[str, list] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        """从磁盘加载缓存"""
+        entries = {}
+        try:
+            if self._path.exists():
+                with open(self._path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == self.VERSION:
+                    entries = data.get("entries") or {}
+        except Exception as e:
+            logger.warning(f"读取TMDB ID缓存失败，将重新识别: {str(e)}")
+        with self._lock:
+            self._entries = entries
+            self._dirty = False
+
+    def save(self):
+        """写回磁盘，清理长期未使用的条目"""
+        now = time.time()
+        with self._lock:
+            idle = [key for key, entry in self._entries.items() if now - entry[4] > self.MAX_IDLE_DAYS * 86400]
+            for key in idle:
+                del self._entries[key]
+            if not self._dirty and not idle:
+                return
+            entries = dict(self._entries)
+            self._dirty = False
+        try:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self._path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": self.VERSION, "entries": entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path)
+        except Exception as e:
+            with self._lock:
+                self._dirty = True
+            logger.error(f"保存TMDB ID缓存失败: {str(e)}")
+
+    def lookup(self, path: str, fingerprint: NfoFingerprint) -> Optional[int]:
+        """NFO 指纹一致时返回缓存的 TMDB ID，不一致时删除条目"""
+        key = os.path.normpath(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry:
+                return None
+            mtime_ns, size, tmdb_id = entry[:3]
+            if (mtime_ns, size) != (fingerprint or (None, None)):
+                del self._entries[key]
+                self._dirty = True
+                return None
+            # 最近使用时间只需天级精度，避免每次运行都重写整个缓存文件
+            if time.time() - entry[4] > 86400:
+                entry[4] = time.time()
+                self._dirty = True
+            return tmdb_id
+
+    def store(self, path: str, fingerprint: NfoFingerprint, tmdb_id: int, method: str):
+        """记录识别结果，method 为识别方式（nfo / meta / path）"""
+        mtime_ns, size = fingerprint or (None, None)
+        with self._lock:
+            self._entries[os.path.normpath(path)] = [mtime_ns, size, tmdb_id, method, time.time()]
+            self._dirty = True
+
+    def move(self, source: str, target: str):
+        """目录被移动后，缓存随目录转到新路径（移动会保留 NFO 的修改时间，指纹仍然有效）"""
+        with self._lock:
+            entry = self._entries.pop(os.path.normpath(source), None)
+            if entry is not None:
+                self._entries[os.path.normpath(target)] = entry
+                self._dirty = True
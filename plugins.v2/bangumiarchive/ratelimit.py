@@ -0,0 +1,26 @@
+"""
+请求限速
+多个识别线程共用一个限速器，按固定间隔依次放行请求，整体请求速率不超过 TMDB 的限制
+"""
+import threading
+import time
+
+
+class RateLimiter:
+    """每秒最多放行 rate 个请求，rate 不大于 0 时不限速；可被多个线程同时使用"""
+
+    def __init__(self, rate: float):
+        self._interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """等待到下一个可用的请求时间"""
+        if not self._interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self._interval
+        if slot > now:
+            time.sleep(slot - now)
@@ -0,0 +1,130 @@
+"""
+重试与熔断
+所有 TMDB 请求共用一个重试策略：失败后按指数退避加随机抖动等待再试；
+连续失败达到阈值后熔断，之后的请求直接失败，不再等待，冷却时间过后放行一次试探请求，成功则恢复；
+明确查不到结果（NotFoundError）不是请求失败，既不重试也不计入熔断
+"""
+import random
+import threading
+import time
+from typing import Callable, Optional, TypeVar
+
+from app.log import logger
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    """熔断期间的请求直接失败"""
+    pass
+
+
+class NotFoundError(Exception):
+    """请求成功但没有结果，不重试，不计入连续失败"""
+    pass
+
+
+class RetryPolicy:
+    """重试策略和熔断器，可被多个线程同时使用"""
+
+    def __init__(self, attempts: int = 3, base_delay: float = 1.0, max_delay: float = 30.0,
+                 failure_threshold: int = 5, reset_after: float = 300.0):
+        """
+        :param attempts: 每次请求最多尝试次数
+        :param base_delay: 首次重试前的等待秒数，之后每次翻倍
+        :param max_delay: 单次等待的上限秒数
+        :param failure_threshold: 连续失败多少次后熔断
+        :param reset_after: 熔断后多少秒放行试探请求
+        """
+        self._attempts = max(int(attempts), 1)
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._failure_threshold = max(int(failure_threshold), 1)
+        self._reset_after = reset_after
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        # 本次运行中熔断的次数和被直接拒绝的请求数
+        self.trips = 0
+        self.rejected = 0
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._opened_at is not None
+
+    def reset(self):
+        """关闭熔断并清空统计，每次运行开始时调用"""
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+            self.trips = 0
+            self.rejected = 0
+
+    def call(self, func: Callable[[], T], attempts: Optional[int] = None) -> T:
+        """
+        执行请求，func 抛出异常视为失败，抛出 NotFoundError 时直接抛出，不重试
+        熔断期间抛出 CircuitOpenError，重试耗尽后抛出最后一次的异常
+        """
+        attempts = max(int(attempts or self._attempts), 1)
+        for attempt in range(attempts):
+            self.__before_call()
+            try:
+                result = func()
+            except NotFoundError:
+                self.__on_not_found()
+                raise
+            except Exception as e:
+                self.__on_failure()
+                # 重试耗尽或已熔断时不再等待
+                if attempt >= attempts - 1 or self.is_open:
+                    raise
+                delay = self.__backoff(attempt)
+                logger.warning(f"第 {attempt + 1} 次请求失败: {str(e)}，{delay:.1f}秒后重试...")
+                time.sleep(delay)
+            else:
+                self.__on_success()
+                return result
+
+    def __backoff(self, attempt: int) -> float:
+        """指数退避，在上限的一半到上限之间随机，避免多个线程同时重试"""
+        delay = min(self._base_delay * (2 ** attempt), self._max_delay)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def __before_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            # 冷却时间已过且没有其他试探请求时放行一次
+            if not self._probing and time.monotonic() - self._opened_at >= self._reset_after:
+                self._probing = True
+                return
+            self.rejected += 1
+        raise CircuitOpenError("TMDB请求连续失败，已暂停请求")
+
+    def __on_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("TMDB请求已恢复")
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def __on_not_found(self):
+        with self._lock:
+            # 不改变连续失败次数；试探请求没有结果时不能说明已恢复，放行下一次试探
+            self._probing = False
+
+    def __on_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing:
+                # 试探失败，重新计时
+                self._probing = False
+                self._opened_at = time.monotonic()
+            elif self._opened_at is None and self._failures >= self._failure_threshold:
+                self._opened_at = time.monotonic()
+                self.trips += 1
+                logger.warning(f"TMDB请求连续失败 {self._failures} 次，暂停请求 {self._reset_after:.0f} 秒")
@@ -0,0 +1,115 @@
+"""
+媒体状态缓存
+按 TMDB ID 记录剧集的状态、最后播出日期和下一集播出日期，有效期随状态变化：
+已完结/已取消的剧集很少变化，缓存较久；本周有播出的剧集随时可能更新，缓存较短；其余居中
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Optional
+
+from app.log import logger
+
+# 不再更新的状态
+ENDED_STATUS = {"Ended", "Canceled"}
+
+
+def status_ttl(status: Optional[str], last_air_date: Optional[str], next_air_date: Optional[str],
+               now: Optional[datetime] = None) -> float:
+    """根据剧集状态计算缓存有效期（秒）"""
+    if status in ENDED_STATUS:
+        return MediaStatusCache.ENDED_TTL
+    now = now or datetime.now()
+    for air_date in (next_air_date, last_air_date):
+        if not air_date:
+            continue
+        try:
+            if abs(datetime.strptime(air_date, "%Y-%m-%d") - now) <= timedelta(days=7):
+                return MediaStatusCache.AIRING_TTL
+        except ValueError:
+            continue
+    return MediaStatusCache.DEFAULT_TTL
+
+
+class MediaStatusCache:
+    """媒体状态缓存，可被多个线程同时使用"""
+    VERSION = 1
+    # 已完结/已取消：30天
+    ENDED_TTL = 30 * 86400
+    # 前后7天内有播出：12小时
+    AIRING_TTL = 12 * 3600
+    # 其他：3天
+    DEFAULT_TTL = 3 * 86400
+    # 过期后继续保留90天，TMDB 不可用时作为降级数据
+    STALE_KEEP = 90 * 86400
+
+    def __init__(self, path: Path):
+        self._path = Path(path)
+        # TMDB ID -> {name, status, last_air_date, next_air_date, expires}
+        self._entries: Dict[str, dict] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        """从磁盘加载缓存"""
+        entries = {}
+        try:
+            if self._path.exists():
+                with open(self._path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == self.VERSION:
+                    entries = data.get("entries") or {}
+        except Exception as e:
+            logger.warning(f"读取媒体状态缓存失败，将重新获取: {str(e)}")
+        with self._lock:
+            self._entries = entries
+            self._dirty = False
+
+    def save(self):
+        """写回磁盘，清理过期超过保留时间的条目"""
+        now = time.time()
+        with self._lock:
+            expired = [key for key, entry in self._entries.items()
+                       if entry.get("expires", 0) + self.STALE_KEEP <= now]
+            for key in expired:
+                del self._entries[key]
+            if not self._dirty and not expired:
+                return
+            entries = dict(self._entries)
+            self._dirty = False
+        try:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self._path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": self.VERSION, "entries": entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path)
+        except Exception as e:
+            with self._lock:
+                self._dirty = True
+            logger.error(f"保存媒体状态缓存失败: {str(e)}")
+
+    def get(self, tmdb_id: int, allow_stale: bool = False) -> Optional[dict]:
+        """返回未过期的媒体状态，allow_stale 时也返回已过期但仍在保留期内的状态（TMDB 不可用时使用）"""
+        with self._lock:
+            entry = self._entries.get(str(tmdb_id))
+        if not entry or (not allow_stale and entry.get("expires", 0) <= time.time()):
+            return None
+        return entry
+
+    def put(self, tmdb_id: int, name: Optional[str], status: Optional[str],
+            last_air_date: Optional[str], next_air_date: Optional[str]) -> dict:
+        """记录媒体状态，返回缓存条目"""
+        entry = {
+            "name": name,
+            "status": status,
+            "last_air_date": last_air_date,
+            "next_air_date": next_air_date,
+            "expires": time.time() + status_ttl(status, last_air_date, next_air_date)
+        }
+        with self._lock:
+            self._entries[str(tmdb_id)] = entry
+            self._dirty = True
+        return entry
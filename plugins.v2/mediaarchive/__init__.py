@@ -2,18 +2,41 @@
 MediaArchive插件
 用于自动归档媒体文件
 """
-from typing import Any, Dict, List, Tuple, NamedTuple, Optional, Set
-from datetime import datetime
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Tuple, NamedTuple, Optional, Set, Iterable, Iterator
+from datetime import datetime, timedelta
+import threading
 import time
 import os
 from pathlib import Path
-import shutil
+import pytz
 from app.core.config import settings
 from app.core.event import eventmanager, Event, EventType
 from app.plugins import _PluginBase
 from app.log import logger
 from app.schemas import NotificationType
+from app.utils.string import StringUtils
+from app.utils.http import RequestUtils
+from app.helper.mediaserver import MediaServerHelper
+from app.plugins.mediaarchive.scanner import DirectoryScanner, FingerprintCache
+from app.plugins.mediaarchive.mover import ArchiveJob, MoveExecutor, device_of
+from app.plugins.mediaarchive.pipeline import ScanPipeline
+from app.plugins.mediaarchive.coordinator import RUN_KINDS, RunCoordinator, RunProgress
+from app.plugins.mediaarchive.transfer import ARCHIVE_MODES, DEDUPE_METHOD, TransferResult, move_tree, format_speed, \
+    discard_partial
+from app.plugins.mediaarchive.dedupe import DEDUPE_MODES, ContentIndex
+from app.plugins.mediaarchive.watcher import WATCH_MODES, ArchiveWatcher
+from app.plugins.mediaarchive.history import HistoryStore
+from app.plugins.mediaarchive.throttle import BandwidthLimiter, parse_hours
+from app.plugins.mediaarchive.metrics import RunMetrics, to_prometheus
+from app.plugins.mediaarchive.report import RunReport
+from app.plugins.mediaarchive.journal import RunJournal, STATE_FAILED, STATE_PLANNED, STATE_REMOVED, STATE_VERIFIED
+from app.plugins.mediaarchive.plan import save_plan, load_plan, plan_jobs, plan_mappings
+from app.plugins.mediaarchive.mapping import ArchiveMapping, find_mapping, overlaps, parse_mapping
+from app.plugins.mediaarchive.rules import DEFAULT_RULES, PathRule, RuleTrie, parse_rule
+from app.plugins.mediaarchive.scheduler import SCHEDULE_POLICIES, SpaceBudget, schedule_jobs
 from apscheduler.schedulers.background import BackgroundScheduler
+from fastapi.responses import PlainTextResponse
 from apscheduler.triggers.cron import CronTrigger
 
 class MediaThreshold(NamedTuple):
@@ -25,7 +48,7 @@ class MediaArchive(_PluginBase):
     # 插件基础信息
     plugin_name = "媒体文件归档"
     plugin_desc = "自动归档媒体文件到指定目录"
-    plugin_version = "1.1"
+    plugin_version = "3.0"
     plugin_author = "Sebastian0619"
     plugin_icon = "emby.png"
     author_url = "https://github.com/sebastian0619"
@@ -41,13 +64,48 @@ class MediaArchive(_PluginBase):
     _target_dir = None
     _test_mode = False
     _notify = False
+    _scan_cache = True
+    _scan_cache_days = 7
+    _move_concurrency = 1
+    _scan_workers = 2
+    _same_fs_mode = "rename"
+    _watch_mode = ""
+    _plan_mode = False
+    _execute_cron = None
+    _path_rules = DEFAULT_RULES
+    _schedule_policy = ""
+    _run_budget_gb = 0.0
+    _reserve_gb = 0.0
+    _dedupe_mode = ""
+    _day_limit_mb = 0.0
+    _night_limit_mb = 0.0
+    _night_hours = "1-8"
+    _pause_mediaserver = ""
+    _stream_limit_mb = 0.0
+    _extra_mappings = ""
     
     # 默认阈值配置
     DEFAULT_THRESHOLDS = "电影#20#20\n电影#30#30\n完结动漫#100#45\n完结动漫#120#60\n电视剧#10#90\n综艺#10#10"
     
     # 媒体类型阈值配置 Dict[str, List[MediaThreshold]]
     _thresholds: Dict[str, List[MediaThreshold]] = {}
+
+    # 目录映射，第一组为源目录/目标目录配置，其后为其他目录映射
+    _mappings: List[ArchiveMapping] = []
     
+    # 插件页面显示的历史记录条数，更多记录通过 API 分页查询
+    PAGE_SIZE = 50
+
+    # 扫描流水线各队列长度及等待移动的任务数上限，超过时上游暂停，内存占用与媒体库规模无关
+    PIPELINE_QUEUE_SIZE = 256
+    MAX_PENDING_MOVES = 64
+
+    # 保存最近多少次运行的指标
+    METRICS_RUNS = 50
+
+    # 路径规则前缀树，只包含配置了阈值的规则
+    _rules: RuleTrie = RuleTrie([])
+
     # 视频文件扩展名
     VIDEO_EXTENSIONS = {
         '.mp4', '.mkv', '.avi', '.ts', '.m2ts',
@@ -57,15 +115,28 @@ class MediaArchive(_PluginBase):
     
     # 在类中初始化
     _scheduler = None
-    _transfer_messages = {
-        "success": [],    # 成功记录
-        "skipped": [],    # 跳过记录
-        "failed": []      # 失败记录
-    }
+    _scanner = None
+    _cache = None
+    _watchers: List[ArchiveWatcher] = []
+    _history = None
+    _journal = None
+    _index = None
+    _metrics: Optional[RunMetrics] = None
+    _limiter: Optional[BandwidthLimiter] = None
+    _progress: Optional[RunProgress] = None
+    # 本次运行的空间调度额度
+    _budget: Optional[SpaceBudget] = None
+    # 定时任务、立即运行与目录监控共用，保证同一时间只有一个归档过程
+    _coordinator = RunCoordinator()
+    # 本次运行的结果汇总，用于发送通知
+    _report = RunReport()
 
     def init_plugin(self, config: dict = None):
         """插件初始化"""
         try:
+            self._scanner = DirectoryScanner(self.VIDEO_EXTENSIONS)
+            self.__init_history()
+            self.__init_journal()
             if config:
                 self._enabled = config.get("enabled", False)
                 self._onlyonce = config.get("onlyonce", False)
@@ -74,6 +145,48 @@ class MediaArchive(_PluginBase):
                 self._target_dir = config.get("target_dir", "")
                 self._test_mode = config.get("test_mode", False)
                 self._notify = config.get("notify", False)
+                self._scan_cache = config.get("scan_cache", True)
+                try:
+                    self._scan_cache_days = int(config.get("scan_cache_days") or 7)
+                except (TypeError, ValueError):
+                    self._scan_cache_days = 7
+                try:
+                    self._move_concurrency = max(int(config.get("move_concurrency") or 1), 1)
+                except (TypeError, ValueError):
+                    self._move_concurrency = 1
+                try:
+                    self._scan_workers = max(int(config.get("scan_workers") or 2), 1)
+                except (TypeError, ValueError):
+                    self._scan_workers = 2
+                self._same_fs_mode = config.get("same_fs_mode") or "rename"
+                if self._same_fs_mode not in ARCHIVE_MODES:
+                    self._same_fs_mode = "rename"
+                self._watch_mode = config.get("watch_mode") or ""
+                self._dedupe_mode = config.get("dedupe_mode") or ""
+                if self._dedupe_mode not in DEDUPE_MODES:
+                    self._dedupe_mode = ""
+                self.__init_index()
+                self._day_limit_mb = self.__parse_rate(config.get("day_limit_mb"))
+                self._night_limit_mb = self.__parse_rate(config.get("night_limit_mb"))
+                self._night_hours = config.get("night_hours") or "1-8"
+                self._pause_mediaserver = config.get("pause_mediaserver") or ""
+                self._stream_limit_mb = self.__parse_rate(config.get("stream_limit_mb"))
+                self.__init_limiter()
+                self._plan_mode = config.get("plan_mode", False)
+                self._schedule_policy = config.get("schedule_policy") or ""
+                if self._schedule_policy not in SCHEDULE_POLICIES:
+                    self._schedule_policy = ""
+                try:
+                    self._run_budget_gb = max(float(config.get("run_budget_gb") or 0), 0.0)
+                except (TypeError, ValueError):
+                    self._run_budget_gb = 0.0
+                try:
+                    self._reserve_gb = max(float(config.get("reserve_gb") or 0), 0.0)
+                except (TypeError, ValueError):
+                    self._reserve_gb = 0.0
+                self._execute_cron = config.get("execute_cron")
+                self._extra_mappings = config.get("extra_mappings") or ""
+                self.__init_mappings()
                 
                 # 更新阈值配置
                 thresholds_str = config.get("thresholds_str", self.DEFAULT_THRESHOLDS)
@@ -91,30 +204,87 @@ class MediaArchive(_PluginBase):
                         ))
                     except Exception as e:
                         logger.error(f"解析阈值配置失败: {line} - {str(e)}")
+
+                # 编译路径规则
+                self._path_rules = config.get("path_rules") or DEFAULT_RULES
+                rules = []
+                for index, line in enumerate(self._path_rules.splitlines()):
+                    if not line.strip():
+                        continue
+                    try:
+                        rule = parse_rule(index, line)
+                    except Exception as e:
+                        logger.error(f"解析路径规则失败: {line} - {str(e)}")
+                        continue
+                    if not rule.thresholds and rule.media_type not in self._thresholds:
+                        logger.warning(f"路径规则 {rule.pattern} 的媒体类型 {rule.media_type} 未配置阈值，已忽略")
+                        continue
+                    rules.append(rule)
+                self._rules = RuleTrie(rules)
                 
-                # 如果开启立即运行
-                if self._enabled and self._onlyonce:
-                    logger.info("媒体归档服务启动，立即运行一次...")
-                    self.process_all_directories()
-                    self._onlyonce = False
-                    self.__update_config()
-                
-                # 周期运行
-                if self._enabled and self._cron:
+                # 继续或回滚上次中断的归档
+                if self._enabled and not self._test_mode and self._journal and self._mappings:
+                    threading.Thread(target=self.__recover_runs, name="mediaarchive-recover", daemon=True).start()
+
+                # 立即运行与周期运行都只提交运行请求，已有运行时排队，不会重叠
+                execute_cron = self._execute_cron if self._plan_mode else None
+                if self._enabled and (self._onlyonce or self._cron or execute_cron):
                     try:
                         self._scheduler = BackgroundScheduler(timezone=settings.TZ)
-                        self._scheduler.add_job(
-                            func=self.process_all_directories,
-                            trigger=CronTrigger.from_crontab(self._cron),
-                            name="媒体归档"
-                        )
+                        if self._onlyonce:
+                            logger.info("媒体归档服务启动，立即运行一次...")
+                            self._scheduler.add_job(
+                                func=self.run_now,
+                                trigger='date',
+                                run_date=datetime.now(tz=pytz.timezone(settings.TZ)) + timedelta(seconds=3),
+                                name="媒体归档"
+                            )
+                            self._onlyonce = False
+                            self.__update_config()
+                        if self._cron:
+                            self._scheduler.add_job(
+                                func=self.run_now,
+                                trigger=CronTrigger.from_crontab(self._cron),
+                                name="媒体归档计划" if self._plan_mode else "媒体归档",
+                                max_instances=1,
+                                coalesce=True
+                            )
+                        # 计划模式下在维护时段执行已生成的计划
+                        if execute_cron:
+                            self._scheduler.add_job(
+                                func=self.run_now,
+                                args=["execute"],
+                                trigger=CronTrigger.from_crontab(execute_cron),
+                                name="执行媒体归档计划",
+                                max_instances=1,
+                                coalesce=True
+                            )
                         if self._scheduler.get_jobs():
                             self._scheduler.print_jobs()
                             self._scheduler.start()
-                            logger.info(f"周期任务已启动，执行周期：{self._cron}")
+                            logger.info(f"周期任务已启动，执行周期：{self._cron}"
+                                        + (f"，计划执行周期：{execute_cron}" if execute_cron else ""))
                     except Exception as err:
                         logger.error(f"周期任务启动失败：{str(err)}")
-                        
+
+                # 目录监控，每组目录映射一个监控
+                if self._enabled and self._watch_mode in WATCH_MODES:
+                    self._watchers = []
+                    for mapping in self._mappings:
+                        try:
+                            watcher = ArchiveWatcher(
+                                source_dir=mapping.source_dir,
+                                mode=self._watch_mode,
+                                classify=self._candidate_of,
+                                eligible_at=self._eligible_at,
+                                seed=lambda mapping=mapping: self.__watch_seed(mapping),
+                                archive=self.archive_directories
+                            )
+                            watcher.start()
+                            self._watchers.append(watcher)
+                        except Exception as err:
+                            logger.error(f"目录监控启动失败 {mapping.source_dir}：{str(err)}")
+
         except Exception as e:
             logger.error(f"插件初始化失败: {str(e)}")
 
@@ -253,6 +423,343 @@ class MediaArchive(_PluginBase):
                     }
                 ]
             },
+            {
+                'component': 'VRow',
+                'content': [
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 12,
+                            'md': 4
+                        },
+                        'content': [
+                            {
+                                'component': 'VSwitch',
+                                'props': {
+                                    'model': 'plan_mode',
+                                    'label': '计划模式'
+                                }
+                            }
+                        ]
+                    },
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 12,
+                            'md': 8
+                        },
+                        'content': [
+                            {
+                                'component': 'VTextField',
+                                'props': {
+                                    'model': 'execute_cron',
+                                    'label': '计划执行周期',
+                                    'placeholder': '计划模式下执行周期只生成归档计划，按此周期执行计划，例如：0 3 * * *'
+                                }
+                            }
+                        ]
+                    }
+                ]
+            },
+            {
+                'component': 'VRow',
+                'content': [
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 12,
+                            'md': 4
+                        },
+                        'content': [
+                            {
+                                'component': 'VSelect',
+                                'props': {
+                                    'model': 'schedule_policy',
+                                    'label': '空间调度',
+                                    'items': [{"title": "关闭", "value": ""}] +
+                                             [{"title": title, "value": value}
+                                              for value, title in SCHEDULE_POLICIES.items()],
+                                    'hint': '统计目录大小并检查目标剩余空间，放不下的目录延后到下次运行',
+                                    'persistent-hint': True
+                                }
+                            }
+                        ]
+                    },
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 12,
+                            'md': 4
+                        },
+                        'content': [
+                            {
+                                'component': 'VTextField',
+                                'props': {
+                                    'model': 'run_budget_gb',
+                                    'label': '单次数据量上限(GB)',
+                                    'placeholder': '每次运行最多复制的数据量，0为不限制'
+                                }
+                            }
+                        ]
+                    },
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 12,
+                            'md': 4
+                        },
+                        'content': [
+                            {
+                                'component': 'VTextField',
+                                'props': {
+                                    'model': 'reserve_gb',
+                                    'label': '目标保留空间(GB)',
+                                    'placeholder': '归档后目标磁盘至少保留的剩余空间，默认：0'
+                                }
+                            }
+                        ]
+                    }
+                ]
+            },
+            {
+                'component': 'VRow',
+                'content': [
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 12,
+                            'md': 4
+                        },
+                        'content': [
+                            {
+                                'component': 'VTextField',
+                                'props': {
+                                    'model': 'day_limit_mb',
+                                    'label': '白天限速(MB/s)',
+                                    'placeholder': '所有移动任务的总复制速度，0为不限速'
+                                }
+                            }
+                        ]
+                    },
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 12,
+                            'md': 4
+                        },
+                        'content': [
+                            {
+                                'component': 'VTextField',
+                                'props': {
+                                    'model': 'night_limit_mb',
+                                    'label': '夜间限速(MB/s)',
+                                    'placeholder': '0为不限速'
+                                }
+                            }
+                        ]
+                    },
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 12,
+                            'md': 4
+                        },
+                        'content': [
+                            {
+                                'component': 'VTextField',
+                                'props': {
+                                    'model': 'night_hours',
+                                    'label': '夜间时段',
+                                    'placeholder': '开始小时-结束小时，默认：1-8'
+                                }
+                            }
+                        ]
+                    }
+                ]
+            },
+            {
+                'component': 'VRow',
+                'content': [
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 12,
+                            'md': 6
+                        },
+                        'content': [
+                            {
+                                'component': 'VSelect',
+                                'props': {
+                                    'model': 'pause_mediaserver',
+                                    'label': '播放时降速的媒体服务器',
+                                    'items': [{"title": config.name, "value": config.name}
+                                              for config in MediaServerHelper().get_configs().values()
+                                              if config.type == "emby"],
+                                    'clearable': True,
+                                    'hint': '该服务器有用户正在播放时按播放时限速复制',
+                                    'persistent-hint': True
+                                }
+                            }
+                        ]
+                    },
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 12,
+                            'md': 6
+                        },
+                        'content': [
+                            {
+                                'component': 'VTextField',
+                                'props': {
+                                    'model': 'stream_limit_mb',
+                                    'label': '播放时限速(MB/s)',
+                                    'placeholder': '0为暂停复制，播放结束后自动恢复'
+                                }
+                            }
+                        ]
+                    }
+                ]
+            },
+            {
+                'component': 'VRow',
+                'content': [
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 12,
+                            'md': 3
+                        },
+                        'content': [
+                            {
+                                'component': 'VSwitch',
+                                'props': {
+                                    'model': 'scan_cache',
+                                    'label': '启用扫描缓存'
+                                }
+                            }
+                        ]
+                    },
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 12,
+                            'md': 3
+                        },
+                        'content': [
+                            {
+                                'component': 'VTextField',
+                                'props': {
+                                    'model': 'scan_cache_days',
+                                    'label': '缓存有效期(天)',
+                                    'placeholder': '超过该天数的缓存会重新扫描，默认：7'
+                                }
+                            }
+                        ]
+                    },
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 12,
+                            'md': 3
+                        },
+                        'content': [
+                            {
+                                'component': 'VTextField',
+                                'props': {
+                                    'model': 'move_concurrency',
+                                    'label': '移动并发数',
+                                    'placeholder': '每组源/目标磁盘同时移动的目录数，默认：1'
+                                }
+                            }
+                        ]
+                    },
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 12,
+                            'md': 3
+                        },
+                        'content': [
+                            {
+                                'component': 'VTextField',
+                                'props': {
+                                    'model': 'scan_workers',
+                                    'label': '判断并发数',
+                                    'placeholder': '同时判断目录的线程数，默认：2'
+                                }
+                            }
+                        ]
+                    }
+                ]
+            },
+            {
+                'component': 'VRow',
+                'content': [
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 12,
+                            'md': 4
+                        },
+                        'content': [
+                            {
+                                'component': 'VSelect',
+                                'props': {
+                                    'model': 'same_fs_mode',
+                                    'label': '同磁盘归档方式',
+                                    'items': [{"title": title, "value": value}
+                                              for value, title in ARCHIVE_MODES.items()],
+                                    'hint': '源目录与目标目录位于同一文件系统时使用，均不可用时才复制数据',
+                                    'persistent-hint': True
+                                }
+                            }
+                        ]
+                    },
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 12,
+                            'md': 4
+                        },
+                        'content': [
+                            {
+                                'component': 'VSelect',
+                                'props': {
+                                    'model': 'watch_mode',
+                                    'label': '目录监控',
+                                    'items': [{"title": "关闭", "value": ""}] +
+                                             [{"title": title, "value": value}
+                                              for value, title in WATCH_MODES.items()],
+                                    'hint': '监控源目录变化，目录达到阈值时立即归档，可与定时任务同时使用',
+                                    'persistent-hint': True
+                                }
+                            }
+                        ]
+                    },
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 12,
+                            'md': 4
+                        },
+                        'content': [
+                            {
+                                'component': 'VSelect',
+                                'props': {
+                                    'model': 'dedupe_mode',
+                                    'label': '重复文件处理',
+                                    'items': [{"title": "关闭", "value": ""}] +
+                                             [{"title": title, "value": value}
+                                              for value, title in DEDUPE_MODES.items()],
+                                    'hint': '跨磁盘归档时，与目标目录中已有文件内容相同的文件不再复制',
+                                    'persistent-hint': True
+                                }
+                            }
+                        ]
+                    }
+                ]
+            },
             {
                 'component': 'VRow',
                 'content': [
@@ -275,16 +782,85 @@ class MediaArchive(_PluginBase):
                         ]
                     }
                 ]
+            },
+            {
+                'component': 'VRow',
+                'content': [
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 12
+                        },
+                        'content': [
+                            {
+                                'component': 'VTextarea',
+                                'props': {
+                                    'model': 'path_rules',
+                                    'label': '路径规则',
+                                    'placeholder': '每行一个规则，格式：路径模式#类型[#创建时间#修改时间]，可写多组阈值\n路径模式相对源目录，每级目录支持 * ? [] 通配符，匹配到的目录作为整体归档\n例如：\n电视剧/*/*#电视剧\n纪录片/*#纪录片#30#30',
+                                    'hint': '多条规则匹配同一路径时靠前的优先；未写阈值的规则使用阈值配置中同类型的阈值',
+                                    'persistent-hint': True,
+                                    'rows': 6,
+                                    'persistent-placeholder': True
+                                }
+                            }
+                        ]
+                    }
+                ]
+            },
+            {
+                'component': 'VRow',
+                'content': [
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 12
+                        },
+                        'content': [
+                            {
+                                'component': 'VTextarea',
+                                'props': {
+                                    'model': 'extra_mappings',
+                                    'label': '其他目录映射',
+                                    'placeholder': '每行一组，格式：源目录=>目标目录[|移动并发数][|类型#创建时间#修改时间]...\n例如：\n/mnt/disk2/media=>/mnt/cloud1/media|2\n/mnt/disk3/media=>/mnt/cloud2/media|1|电影#60#60|电视剧#30#120',
+                                    'hint': '与上方源目录/目标目录一起并行扫描和归档；未写并发数时使用移动并发数，未写阈值的类型使用阈值配置',
+                                    'persistent-hint': True,
+                                    'rows': 3,
+                                    'persistent-placeholder': True
+                                }
+                            }
+                        ]
+                    }
+                ]
             }
         ], {
             'enabled': False,
             'onlyonce': False,
             'test_mode': False,
             'notify': False,
+            'scan_cache': True,
+            'scan_cache_days': 7,
+            'move_concurrency': 1,
+            'scan_workers': 2,
+            'same_fs_mode': 'rename',
+            'watch_mode': '',
+            'dedupe_mode': '',
+            'day_limit_mb': 0,
+            'night_limit_mb': 0,
+            'night_hours': '1-8',
+            'pause_mediaserver': '',
+            'stream_limit_mb': 0,
+            'plan_mode': False,
+            'execute_cron': '',
+            'schedule_policy': '',
+            'run_budget_gb': 0,
+            'reserve_gb': 0,
             'cron': '5 1 * * *',
             'source_dir': '',
             'target_dir': '',
-            'thresholds_str': self.DEFAULT_THRESHOLDS
+            'thresholds_str': self.DEFAULT_THRESHOLDS,
+            'path_rules': DEFAULT_RULES,
+            'extra_mappings': ''
         }
 
     def get_state(self) -> bool:
@@ -299,158 +875,755 @@ class MediaArchive(_PluginBase):
             logger.error(f"获取创建时间失败 {path}: {e}")
             return time.time()
 
-    def __get_media_type(self, path: Path) -> str:
-        """根据路径判断媒体类型"""
-        path_str = str(path)
-        if "/电影/" in path_str:
-            return "电影"
-        elif "/动漫/完结动漫/" in path_str:
-            return "完结动漫"
-        elif "/电视剧/" in path_str:
-            return "电视剧"
-        elif "/综艺/" in path_str:
-            return "综艺"
-        return ""
-
-    def __has_recent_files(self, directory: Path, mtime_threshold: int) -> tuple[bool, list[Path]]:
-        """检查目录是否有最近修改的视频文件"""
-        recent_files = []
-        for file_path in directory.rglob("*"):
-            if file_path.is_file() and file_path.suffix.lower() in self.VIDEO_EXTENSIONS:
-                mtime = file_path.stat().st_mtime
-                age_days = (time.time() - mtime) / 86400
-                if age_days < mtime_threshold:
-                    recent_files.append(file_path)
-        return bool(recent_files), recent_files
-
-    def process_directory(self, directory: Path):
-        """处理单个目录"""
+    def __classify(self, path: Path) -> Optional[Tuple[Path, PathRule, ArchiveMapping]]:
+        """按路径规则返回路径所属的候选目录、命中的规则及所属的目录映射"""
+        mapping = find_mapping(self._mappings, path)
+        if not mapping:
+            return None
+        parts = Path(path).relative_to(mapping.source_dir).parts
+        matched = self._rules.match(parts)
+        if not matched:
+            return None
+        depth, rule = matched
+        return mapping.source_dir.joinpath(*parts[:depth]), rule, mapping
+
+    def __rule_of(self, directory: Path) -> Optional[Tuple[PathRule, ArchiveMapping]]:
+        """候选目录命中的路径规则及所属的目录映射，目录不是候选目录本身时返回 None"""
+        classified = self.__classify(directory)
+        if not classified or classified[0] != Path(directory):
+            return None
+        return classified[1], classified[2]
+
+    def __thresholds_of(self, rule: PathRule, mapping: ArchiveMapping) -> List[MediaThreshold]:
+        """规则适用的阈值：规则单独配置的阈值优先，其次为目录映射配置的同类型阈值，最后为阈值配置"""
+        thresholds = rule.thresholds or mapping.thresholds_of(rule.media_type)
+        if thresholds:
+            return [MediaThreshold(creation_days=creation_days, mtime_days=mtime_days)
+                    for creation_days, mtime_days in thresholds]
+        return self._thresholds.get(rule.media_type) or []
+
+    def _candidate_of(self, path: Path) -> Optional[Path]:
+        """返回路径所属的候选目录，不属于任何候选目录时返回 None"""
+        classified = self.__classify(path)
+        return classified[0] if classified else None
+
+    def _eligible_at(self, directory: Path, cache: FingerprintCache = None) -> Optional[float]:
+        """
+        计算目录满足归档条件的时间戳（任一组阈值满足即可）
+        目录不存在或媒体类型未配置阈值时返回 None
+        """
+        matched = self.__rule_of(directory)
+        thresholds = self.__thresholds_of(*matched) if matched else []
+        if not thresholds or not directory.is_dir():
+            return None
         try:
-            media_type = self.__get_media_type(directory)
-            if not media_type or media_type not in self._thresholds:
-                return
+            creation_time = self.__get_creation_time(directory)
+            summary = self._scanner.scan(directory, cache)
+        except OSError:
+            return None
+        candidates = []
+        for threshold in thresholds:
+            eligible_at = creation_time + threshold.creation_days * 86400
+            if summary.video_count:
+                eligible_at = max(eligible_at, summary.newest_mtime + threshold.mtime_days * 86400)
+            candidates.append(eligible_at)
+        return min(candidates) if candidates else None
+
+    def __watch_seed(self, mapping: ArchiveMapping) -> Iterator[Tuple[Path, float]]:
+        """目录监控启动时计算目录映射中所有候选目录的可归档时间"""
+        with self._coordinator.run("watch"):
+            cache = None
+            if self._scan_cache:
+                cache = FingerprintCache(self.get_data_path() / "scan_cache.json",
+                                         max_age_days=self._scan_cache_days)
+                cache.load()
+            try:
+                for directory in self.__iter_candidates(mapping):
+                    eligible_at = self._eligible_at(directory, cache)
+                    if eligible_at is not None:
+                        yield directory, eligible_at
+            finally:
+                if cache:
+                    cache.save()
+
+    def process_directory(self, directory: Path) -> Optional[ArchiveJob]:
+        """处理单个目录，满足归档条件时返回归档任务"""
+        try:
+            matched = self.__rule_of(directory)
+            thresholds = self.__thresholds_of(*matched) if matched else []
+            if not thresholds:
+                return None
+            rule, mapping = matched
+            media_type = rule.media_type
 
+            now = time.time()
             creation_time = self.__get_creation_time(directory)
-            age_days = (time.time() - creation_time) / 86400
+            age_days = (now - creation_time) / 86400
 
-            # 检查是否满足任一组阈值配置
+            # 检查是否满足任一组阈值配置，目录只扫描一次，所有阈值共用扫描结果
             should_archive = False
             matched_threshold = None
-            for threshold in self._thresholds[media_type]:
+            summary = None
+            reason = "未到创建时间"
+            for threshold in thresholds:
                 if age_days >= threshold.creation_days:
-                    has_recent, recent_files = self.__has_recent_files(directory, threshold.mtime_days)
-                    if not has_recent:
+                    reason = "近期有修改"
+                    if summary is None:
+                        summary = self._scanner.scan(directory, self._cache, metrics=self._metrics)
+                    if not summary.has_recent(threshold.mtime_days, now):
                         should_archive = True
                         matched_threshold = threshold
                         break
 
             if not should_archive:
-                msg = f"[跳过] {media_type}: {directory.name} (不满足任何阈值配置)"
+                msg = f"[跳过] {media_type}: {directory.name} (创建时间 {age_days:.1f}天，{reason})"
                 logger.info(msg)
-                self._transfer_messages["skipped"].append(msg)
-                return
+                self._report.add("skipped", media_type, reason, msg, weight=age_days)
+                self.__count(skipped=1)
+                return None
 
             # 准备归档
-            source_dir = Path(self._source_dir)
-            target_dir = Path(self._target_dir)
-            relative_path = directory.relative_to(source_dir)
-            destination = target_dir / relative_path
-            
+            destination = mapping.target_dir / directory.relative_to(mapping.source_dir)
+
+            return ArchiveJob(
+                media_type=media_type,
+                source=directory,
+                destination=destination,
+                age_days=age_days,
+                threshold_days=matched_threshold.creation_days,
+                mtime_days=matched_threshold.mtime_days
+            )
+
+        except Exception as e:
+            logger.error(f"处理目录出错 {directory}: {e}")
+            return None
+
+    def __move_directory(self, job: ArchiveJob) -> TransferResult:
+        """执行目录移动（在移动线程池中运行）"""
+        # 创建目标目录
+        progress = self._progress
+        if progress:
+            progress.start_job(job.source.name)
+        failed = True
+        try:
+            job.destination.parent.mkdir(parents=True, exist_ok=True)
+            # 同设备按配置重命名/克隆/硬链接，跨设备使用内核态复制，支持断点续传
+            limiter = self._limiter
+            result = move_tree(job.source, job.destination, mode=self._same_fs_mode,
+                               on_state=lambda state: self.__journal_write("update", job, state),
+                               dedupe=self.__dedupe_file if self._index else None,
+                               throttle=limiter.acquire if limiter and limiter.enabled else None)
+            failed = False
+            return result
+        finally:
+            # 移动完成即更新进度，结果稍后在判断线程中汇总
+            if progress:
+                progress.end_job(job.source.name, failed=failed)
+
+    def __finish_job(self, job: ArchiveJob, result: Optional[TransferResult], error: Optional[BaseException]):
+        """记录归档任务结果"""
+        if error:
+            msg = f"[错误] 转移失败 {job.source.name}: {error}"
+            logger.error(msg)
+            self._report.add("failed", job.media_type, "转移失败", msg)
+            self.__count(moves_failed=1)
+            # 已捕获的失败不留待启动时恢复，避免未经阈值判断就继续移动
+            self.__journal_write("fail", job)
+            return
+
+        if self._metrics:
+            self._metrics.record_job(job.source.name, job.media_type, result.bytes_copied,
+                                     result.seconds, result.method)
+        if self._cache:
+            self._cache.discard_tree(str(job.source))
+        labels = {**ARCHIVE_MODES, DEDUPE_METHOD: "重复文件" + DEDUPE_MODES.get(self._dedupe_mode, "")}
+        methods = result.method.split("+")
+        speed = "+".join(labels.get(method) or format_speed(result.speed) for method in methods)
+        msg = f"[转移] {job.media_type}: {job.source.name} -> {job.destination} (创建时间 {job.age_days:.1f}天 >= {job.threshold_days}天, {speed})"
+        logger.info(msg)
+        self._report.add("success", job.media_type, "+".join(labels.get(method, "复制") for method in methods),
+                         msg, weight=result.bytes_copied or job.size)
+
+        # 保存转移历史
+        history = {
+            "create_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "media_type": job.media_type,
+            "media_name": job.source.name,
+            "source": str(job.source),
+            "target": str(job.destination),
+            "age_days": round(job.age_days, 1),
+            "threshold_days": job.threshold_days,
+            "bytes": result.bytes_copied,
+            "seconds": round(result.seconds, 1)
+        }
+        self.__save_history(history)
+        self.__journal_write("finish", job)
+
+    def process_all_directories(self):
+        """处理所有目录，计划模式下只生成归档计划"""
+        if not self._mappings:
+            logger.error("未配置源目录或目标目录")
+            return
+        if self._plan_mode:
+            self.create_plan()
+        else:
+            self.__run_archive({mapping: self.__decide(self.__iter_candidates(mapping))
+                                for mapping in self._mappings})
+
+    def run_now(self, kind: str = "archive") -> str:
+        """
+        非阻塞地请求一次运行（archive 归档 / plan 生成计划 / execute 执行计划）
+        已有运行时排队，等待中的同类请求合并为一次
+        """
+        func = {
+            "archive": self.process_all_directories,
+            "plan": self.create_plan,
+            "execute": self.execute_plan
+        }[kind]
+        result = self._coordinator.request(kind, func)
+        if result == "queued":
+            logger.info(f"已有归档任务正在运行，{RUN_KINDS[kind]}已排队，将在当前运行结束后开始")
+        elif result == "merged":
+            logger.info(f"{RUN_KINDS[kind]}已在排队中，本次请求已合并")
+        return result
+
+    def archive_directories(self, directories: Iterable[Path]):
+        """处理指定的候选目录（目录监控到期时调用）"""
+        grouped: Dict[ArchiveMapping, List[Path]] = {}
+        for directory in directories:
+            mapping = find_mapping(self._mappings, directory)
+            if mapping:
+                grouped.setdefault(mapping, []).append(directory)
+        if grouped:
+            self.__run_archive({mapping: self.__decide(items) for mapping, items in grouped.items()}, kind="watch")
+
+    def __group_jobs(self, jobs: Iterable[ArchiveJob]) -> Dict[ArchiveMapping, List[ArchiveJob]]:
+        """按所属目录映射分组，不属于当前任何映射的任务记为失败"""
+        grouped: Dict[ArchiveMapping, List[ArchiveJob]] = {}
+        for job in jobs:
+            mapping = find_mapping(self._mappings, job.source)
+            if not mapping:
+                msg = f"[错误] 转移失败 {job.source.name}: 源目录已不在当前配置中"
+                logger.error(msg)
+                self._report.add("failed", job.media_type, "源目录已不在当前配置中", msg)
+                self.__count(moves_failed=1)
+                continue
+            grouped.setdefault(mapping, []).append(job)
+        return grouped
+
+    def __for_each_mapping(self, streams: Dict[ArchiveMapping, Iterable], func: Callable[[ArchiveMapping, Iterable], None]):
+        """每组目录映射在独立线程中并行处理，全部完成后抛出第一个出错映射的异常"""
+        if self._progress:
+            self._progress.expect_scans(len(streams))
+        errors = []
+        with ThreadPoolExecutor(max_workers=max(len(streams), 1), thread_name_prefix="mediaarchive-mapping") as pool:
+            futures = {pool.submit(func, mapping, items): mapping for mapping, items in streams.items()}
+            for future, mapping in futures.items():
+                error = future.exception()
+                if error:
+                    logger.error(f"处理目录映射出错 {mapping.source_dir} => {mapping.target_dir}: {str(error)}")
+                    errors.append(error)
+        if errors:
+            raise errors[0]
+
+    def __decide(self, directories: Iterable[Path]) -> Iterable[ArchiveJob]:
+        """流水线判断目录，按判断完成顺序返回满足归档条件的任务（迭代时才开始遍历）"""
+        return ScanPipeline(self.__enumerate(directories), self.__timed_decide, workers=self._scan_workers,
+                            queue_size=self.PIPELINE_QUEUE_SIZE)
+
+    def __enumerate(self, directories: Iterable[Path]) -> Iterator[Path]:
+        """遍历候选目录并计入遍历耗时"""
+        if not self._metrics:
+            yield from directories
+            return
+        yield from self._metrics.iterate("enumerate", directories, counter="candidates")
+
+    def __timed_decide(self, directory: Path) -> Optional[ArchiveJob]:
+        """判断目录并计入判断耗时"""
+        if not self._metrics:
+            return self.process_directory(directory)
+        return self._metrics.timed("decide", self.process_directory, directory)
+
+    def __count(self, **counters: int):
+        """累加本次运行的计数"""
+        if self._metrics:
+            self._metrics.add(**counters)
+
+    def __plan_path(self) -> Path:
+        """归档计划文件路径"""
+        return self.get_data_path() / "archive_plan.json"
+
+    def __begin_run(self, kind: str, progress: RunProgress = None):
+        """开始一次处理：重新开始汇总结果，开始记录运行指标和进度并加载目录指纹缓存"""
+        self._metrics = RunMetrics(kind)
+        self._progress = progress
+        self._report = RunReport()
+        # 空间调度的额度：数据量上限和各目标磁盘的剩余空间，所有映射共用
+        self._budget = SpaceBudget(int(self._run_budget_gb * 1024 ** 3) if self._run_budget_gb else None,
+                                   int(self._reserve_gb * 1024 ** 3))
+        if self._scan_cache:
+            self._cache = FingerprintCache(self.get_data_path() / "scan_cache.json",
+                                           max_age_days=self._scan_cache_days)
+            self._cache.load()
+        else:
+            self._cache = None
+
+    def __end_run(self):
+        """结束处理：保存目录指纹缓存和运行指标，将本次复制的文件写入内容索引"""
+        self.__save_metrics()
+        self._progress = None
+        self._budget = None
+        if self._cache:
+            self._cache.save()
+            self._cache = None
+        if self._index:
+            try:
+                self._index.commit()
+            except Exception as e:
+                logger.error(f"更新内容索引失败: {str(e)}")
+
+    def create_plan(self):
+        """扫描并生成归档计划，不移动任何文件"""
+        if not self._mappings:
+            logger.error("未配置源目录或目标目录")
+            return
+        with self._coordinator.run("plan") as progress:
             try:
+                logger.info("=== 开始生成媒体归档计划 ===")
+                self.__begin_run("plan", progress)
+                planned: Dict[ArchiveMapping, List[ArchiveJob]] = {mapping: [] for mapping in self._mappings}
+
+                def plan_mapping(mapping: ArchiveMapping, candidates: Iterable[ArchiveJob]):
+                    for job in candidates:
+                        progress.add_job()
+                        progress.start_job(job.source.name)
+                        # 统计目录大小，便于审核和安排执行时段；单个目录出错不影响其他目录
+                        try:
+                            size = self._scanner.scan(job.source, self._cache, with_size=True,
+                                                      metrics=self._metrics).size
+                        except OSError as e:
+                            progress.end_job(job.source.name, failed=True)
+                            msg = f"[错误] 统计目录大小失败 {job.source.name}: {str(e)}"
+                            logger.error(msg)
+                            self._report.add("failed", job.media_type, "统计目录大小失败", msg)
+                            self.__count(moves_failed=1)
+                            continue
+                        progress.end_job(job.source.name)
+                        self.__count(jobs=1)
+                        job = job._replace(size=size)
+                        planned[mapping].append(job)
+                        msg = f"[计划] {job.media_type}: {job.source.name} -> {job.destination} ({StringUtils.str_filesize(size)})"
+                        logger.info(msg)
+                        self._report.add("success", job.media_type, "已计划", msg, weight=size)
+                    progress.scan_finished()
+
+                self.__for_each_mapping({mapping: self.__decide(self.__iter_candidates(mapping))
+                                         for mapping in self._mappings}, plan_mapping)
+                jobs = [job for mapping in self._mappings for job in planned[mapping]]
+                save_plan(self.__plan_path(), [(mapping.source_dir, mapping.target_dir) for mapping in self._mappings],
+                          jobs)
+                logger.info(f"=== 归档计划已生成：{len(jobs)} 个目录，"
+                            f"共 {StringUtils.str_filesize(sum(job.size for job in jobs))} ===")
+                self.__send_notification()
+            except Exception as e:
+                logger.error(f"生成归档计划出错: {str(e)}")
+            finally:
+                self.__end_run()
+
+    def execute_plan(self):
+        """执行已生成的归档计划，不重新扫描"""
+        try:
+            plan = load_plan(self.__plan_path())
+        except Exception as e:
+            logger.error(f"读取归档计划失败: {str(e)}")
+            return
+        if not plan:
+            logger.info("没有待执行的归档计划")
+            return
+        if plan_mappings(plan) != [(str(mapping.source_dir), str(mapping.target_dir)) for mapping in self._mappings]:
+            logger.error("归档计划的源目录或目标目录与当前配置不一致，已忽略该计划")
+            return
+        logger.info(f"执行归档计划（生成于 {plan.get('create_time')}）")
+        self.__run_archive(lambda: self.__group_jobs(self.__planned_jobs(plan)), kind="execute",
+                           after=None if self._test_mode else lambda: self.__prune_plan(plan))
+
+    def __prune_plan(self, plan: Dict[str, Any]):
+        """从计划中删除已完成的条目，转移失败或被延后的条目（源目录仍存在）保留到下次执行"""
+        path = self.__plan_path()
+        remaining = [job for job in plan_jobs(plan) if job.source.is_dir()]
+        if not remaining:
+            path.unlink(missing_ok=True)
+            return
+        save_plan(path, [(mapping.source_dir, mapping.target_dir) for mapping in self._mappings], remaining,
+                  create_time=plan.get("create_time"))
+        logger.warning(f"归档计划中有 {len(remaining)} 个目录未完成，"
+                       f"共 {StringUtils.str_filesize(sum(job.size for job in remaining))}，已保留在计划中，下次执行时重试")
+
+    def __planned_jobs(self, plan: Dict[str, Any]) -> Iterator[ArchiveJob]:
+        """读取计划中的任务，跳过源目录已不存在的条目"""
+        for job in plan_jobs(plan):
+            if not job.source.is_dir():
+                msg = f"[错误] 转移失败 {job.source.name}: 源目录不存在"
+                logger.error(msg)
+                self._report.add("failed", job.media_type, "源目录不存在", msg)
+                self.__count(moves_failed=1)
+                continue
+            yield job
+
+    def __iter_candidates(self, mapping: ArchiveMapping) -> Iterator[Path]:
+        """按路径规则遍历映射源目录下的所有候选目录，只进入规则引用到的目录"""
+        current = None
+        for directory, rule in self._rules.walk(mapping.source_dir):
+            if rule.pattern != current:
+                current = rule.pattern
+                logger.info(f"\n处理类型: {mapping.source_dir / rule.pattern} ({rule.media_type})")
+            yield directory
+
+    def __run_archive(self, streams: Any, schedule: bool = True, kind: str = "archive",
+                      after: Optional[Callable[[], None]] = None):
+        """
+        执行归档任务，完成后发送通知
+        streams 为 目录映射 -> 归档任务 的字典，或在获得运行权后生成该字典的函数；各映射并行处理
+        schedule 为 False 时不经过空间调度（恢复中断的归档），kind 为运行指标中记录的运行类型
+        after 在释放运行权前调用（无论是否出错），用于更新计划文件等需要与其他运行互斥的收尾工作
+        """
+        with self._coordinator.run(kind) as progress:
+            try:
+                logger.info("=== 开始处理媒体文件归档 ===")
+                self.__begin_run(kind, progress)
+                if callable(streams):
+                    streams = streams()
+
+                # 内容索引过期时在后台增量刷新，刷新期间使用已有索引
+                if self._index and not self._test_mode and self._index.is_stale():
+                    threading.Thread(target=self._index.refresh,
+                                     args=tuple(mapping.target_dir for mapping in self._mappings),
+                                     name="mediaarchive-index", daemon=True).start()
+
+                # 各目录映射独立扫描、调度和移动，互不等待
+                self.__for_each_mapping(streams, lambda mapping, jobs: self.__archive_mapping(mapping, jobs, schedule))
+
+                logger.info("\n=== 归档处理完成 ===")
+
+                # 发送通知
+                self.__send_notification()
+
+            except Exception as e:
+                logger.error(f"处理过程出错: {str(e)}")
+                if self._notify:
+                    self.post_message(
+                        mtype=NotificationType.SiteMessage,
+                        title="【媒体归档处理失败】",
+                        text=f"处理过程出错：{str(e)}"
+                    )
+            finally:
+                if after:
+                    try:
+                        after()
+                    except Exception as e:
+                        logger.error(f"归档收尾出错: {str(e)}")
+                self.__end_run()
+
+    def __archive_mapping(self, mapping: ArchiveMapping, jobs: Iterable[ArchiveJob], schedule: bool):
+        """处理一组目录映射的归档任务：判断过程中即提交移动任务，不同磁盘之间并行移动"""
+        progress = self._progress
+        if self._schedule_policy and schedule:
+            jobs = self.__schedule(mapping, jobs)
+        executor = MoveExecutor(self.__move_directory, concurrency=mapping.move_concurrency)
+        pending: Dict[Future, ArchiveJob] = {}
+        try:
+            for job in jobs:
+                self.__count(jobs=1)
+                progress.add_job()
                 if self._test_mode:
-                    msg = f"[测试] {media_type}: {directory.name} -> {destination} (创建时间 {age_days:.1f}天 >= {matched_threshold.creation_days}天)"
-                    logger.info(msg)
-                    self._transfer_messages["success"].append(msg)
-                else:
-                    # 创建目标目录
-                    destination.parent.mkdir(parents=True, exist_ok=True)
-                    # 移动目录
-                    shutil.move(str(directory), str(destination))
-                    msg = f"[转移] {media_type}: {directory.name} -> {destination} (创建时间 {age_days:.1f}天 >= {matched_threshold.creation_days}天)"
+                    msg = f"[测试] {job.media_type}: {job.source.name} -> {job.destination} (创建时间 {job.age_days:.1f}天 >= {job.threshold_days}天)"
                     logger.info(msg)
-                    self._transfer_messages["success"].append(msg)
-                    
-                    # 保存转移历史
-                    history = {
-                        "create_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                        "media_type": media_type,
-                        "media_name": directory.name,
-                        "source": str(directory),
-                        "target": str(destination),
-                        "age_days": round(age_days, 1),
-                        "threshold_days": matched_threshold.creation_days
-                    }
-                    self.__save_history(history)
-                    
+                    self._report.add("success", job.media_type, "测试", msg, weight=job.size)
+                    progress.start_job(job.source.name)
+                    progress.end_job(job.source.name)
+                    continue
+                try:
+                    self.__journal_write("plan", job)
+                    pending[executor.submit(job)] = job
+                except Exception as e:
+                    progress.end_job(job.source.name, failed=True)
+                    self.__finish_job(job, None, e)
+                # 等待移动的任务过多时先处理已完成的，判断流水线随之暂停
+                if len(pending) >= self.MAX_PENDING_MOVES:
+                    self.__reap_moves(pending, return_when=FIRST_COMPLETED)
+            progress.scan_finished()
+
+            # 等待剩余移动完成并汇总结果
+            self.__reap_moves(pending)
+        finally:
+            executor.shutdown()
+
+    def __schedule(self, mapping: ArchiveMapping, jobs: Iterable[ArchiveJob]) -> List[ArchiveJob]:
+        """统计目录大小，按调度策略选出本次可归档的目录，其余延后"""
+        sized = []
+        for job in jobs:
+            if not job.size:
+                try:
+                    job = job._replace(size=self._scanner.scan(job.source, self._cache, with_size=True,
+                                                               metrics=self._metrics).size)
+                except OSError as e:
+                    logger.error(f"统计目录大小失败 {job.source}: {str(e)}")
+                    continue
+            sized.append(job)
+
+        # 额度由本次运行的所有映射共用，写入同一磁盘的映射不会重复计算剩余空间
+        budget = self._budget
+        capacity = budget.available(mapping.target_dir)
+
+        def needs_space(job: ArchiveJob) -> bool:
+            return device_of(job.source) != device_of(job.destination.parent)
+
+        selected, deferred = schedule_jobs(sized, self._schedule_policy,
+                                           lambda job: budget.take(mapping.target_dir, job.size), needs_space)
+        if capacity is not None:
+            logger.info(f"{mapping.target_dir} 调度前可用空间 {StringUtils.str_filesize(capacity)}，"
+                        f"归档 {len(selected)} 个目录，延后 {len(deferred)} 个目录")
+        for job in deferred:
+            msg = f"[延后] {job.media_type}: {job.source.name} ({StringUtils.str_filesize(job.size)}，超出本次可用空间)"
+            logger.info(msg)
+            self._report.add("deferred", job.media_type, "超出本次可用空间", msg, weight=job.size)
+        self.__count(deferred=len(deferred))
+        return selected
+
+    def __reap_moves(self, pending: Dict[Future, ArchiveJob], return_when: str = "ALL_COMPLETED"):
+        """等待移动任务完成并记录结果"""
+        done, _ = wait(list(pending), return_when=return_when)
+        for future in done:
+            job = pending.pop(future)
+            error = future.exception()
+            self.__finish_job(job, None if error else future.result(), error)
+
+    @staticmethod
+    def __parse_rate(value: Any) -> float:
+        """解析速度配置（MB/s），无效或负数时为0"""
+        try:
+            return max(float(value or 0), 0.0)
+        except (TypeError, ValueError):
+            return 0.0
+
+    def __init_limiter(self):
+        """按配置创建限速器，替换前停止旧的限速器"""
+        if self._limiter:
+            self._limiter.stop()
+        night_hours = parse_hours(self._night_hours)
+        if self._night_limit_mb and not night_hours:
+            logger.error(f"夜间时段格式错误：{self._night_hours}，应为 开始小时-结束小时")
+
+        def rate(mb: float) -> Optional[float]:
+            return mb * 1024 * 1024 if mb > 0 else None
+
+        self._limiter = BandwidthLimiter(
+            day_rate=rate(self._day_limit_mb),
+            night_rate=rate(self._night_limit_mb) if night_hours else rate(self._day_limit_mb),
+            night_hours=night_hours,
+            is_streaming=self.__emby_streaming if self._pause_mediaserver else None,
+            stream_rate=self._stream_limit_mb * 1024 * 1024
+        )
+
+    def __emby_streaming(self) -> bool:
+        """通过 Emby Sessions 接口判断是否有用户正在播放"""
+        server_info = MediaServerHelper().get_service(self._pause_mediaserver)
+        if not server_info:
+            logger.warning(f"获取媒体服务器 {self._pause_mediaserver} 失败，不检查播放状态")
+            return False
+        host = server_info.config.config.get("host")
+        apikey = server_info.config.config.get("apikey")
+        if not host or not apikey:
+            return False
+        if not host.endswith("/"):
+            host += "/"
+        if not host.startswith("http"):
+            host = "http://" + host
+        res = RequestUtils().get_res(f"{host}emby/Sessions?api_key={apikey}")
+        if res is None or res.status_code != 200:
+            logger.warning(f"查询 Emby 播放会话失败：{res.status_code if res is not None else '无响应'}")
+            return False
+        return any(session.get("NowPlayingItem") for session in res.json() or [])
+
+    def __init_mappings(self):
+        """解析目录映射，源目录与已有映射相同或互相包含的映射会被忽略"""
+        self._mappings = []
+        if self._source_dir and self._target_dir:
+            self._mappings.append(ArchiveMapping(source_dir=Path(self._source_dir), target_dir=Path(self._target_dir),
+                                                 move_concurrency=self._move_concurrency))
+        for line in self._extra_mappings.splitlines():
+            if not line.strip():
+                continue
+            try:
+                mapping = parse_mapping(line, self._move_concurrency)
             except Exception as e:
-                msg = f"[错误] 转移失败 {directory.name}: {e}"
-                logger.error(msg)
-                self._transfer_messages["failed"].append(msg)
-                
+                logger.error(f"解析目录映射失败: {line} - {str(e)}")
+                continue
+            other = overlaps(mapping, self._mappings)
+            if other:
+                logger.error(f"目录映射 {line} 的源目录与 {other.source_dir} 重叠，已忽略")
+                continue
+            self._mappings.append(mapping)
+
+    def __init_index(self):
+        """初始化目标目录内容索引，未开启重复文件处理时不创建"""
+        self._index = None
+        if not self._dedupe_mode:
+            return
+        try:
+            self._index = ContentIndex(self.get_data_path() / "content_index.db")
         except Exception as e:
-            logger.error(f"处理目录出错 {directory}: {e}")
+            logger.error(f"初始化内容索引失败: {str(e)}")
 
-    def process_all_directories(self):
-        """处理所有目录"""
-        if not self._source_dir or not self._target_dir:
-            logger.error("未配置源目录或目标目录")
+    def __dedupe_file(self, src: Path, dst: Path) -> bool:
+        """源文件与目标目录中已有文件内容相同时按配置建立硬链接或跳过，返回是否已处理"""
+        try:
+            mapping = find_mapping(self._mappings, src)
+            match = self._index.find(src, dst, root=mapping.target_dir if mapping else None)
+        except OSError as e:
+            logger.warning(f"查询内容索引失败 {src}: {str(e)}")
+            return False
+        if not match:
+            return False
+        if self._dedupe_mode == "link":
+            try:
+                os.link(match, dst)
+                logger.info(f"重复文件已硬链接: {src.name} -> {match}")
+                return True
+            except OSError as e:
+                logger.warning(f"重复文件无法建立硬链接，改为跳过 {src.name}: {str(e)}")
+        logger.info(f"重复文件已跳过: {src.name}（与 {match} 相同）")
+        return True
+
+    def __init_journal(self):
+        """初始化归档日志"""
+        try:
+            self._journal = RunJournal(self.get_data_path() / "journal.db")
+        except Exception as e:
+            self._journal = None
+            logger.error(f"初始化归档日志失败: {str(e)}")
+
+    def __journal_write(self, action: str, job: ArchiveJob, *args):
+        """写入归档日志，日志不可用或写入失败时不影响归档"""
+        if not self._journal:
             return
-            
         try:
-            logger.info("=== 开始处理媒体文件归档 ===")
-            
-            # 清空之前的消息
-            self._transfer_messages = {
-                "success": [],
-                "skipped": [],
-                "failed": []
-            }
-            
-            source_dir = Path(self._source_dir)
-            patterns = [
-                "电视剧/*/*",
-                "动漫/完结动漫/*",
-                "电影/*/*",
-                "综艺/*"
-            ]
+            getattr(self._journal, action)(job, *args)
+        except Exception as e:
+            logger.error(f"写入归档日志失败 {job.source}: {str(e)}")
 
-            for pattern in patterns:
-                directories = list(source_dir.glob(pattern))
-                if directories:
-                    logger.info(f"\n处理类型: {pattern}")
-                    for directory in directories:
-                        if directory.is_dir():
-                            self.process_directory(directory)
-            
-            logger.info("\n=== 归档处理完成 ===")
-            
-            # 发送通知
-            self.__send_notification()
-            
+    def __recover_runs(self):
+        """
+        启动时处理上次中断的归档
+        已计划未开始的丢弃，下次运行重新判断；运行中已失败的回滚，下次运行重新判断；复制中且源目录仍在的继续复制（已完成的文件和 .partial 会复用），
+        目标目录已不在当前配置中的回滚；已校验的继续删除源目录；已删除源目录的补写历史记录
+        """
+        try:
+            if not self._journal.pending():
+                return
         except Exception as e:
-            logger.error(f"处理过程出错: {str(e)}")
-            if self._notify:
-                self.post_message(
-                    mtype=NotificationType.SiteMessage,
-                    title="【媒体归档处理失败】",
-                    text=f"处理过程出错：{str(e)}"
-                )
+            logger.error(f"读取归档日志失败: {str(e)}")
+            return
+        # 保存配置时插件重新初始化，上一个实例的归档可能仍在进行，其日志条目不能当作中断处理；
+        # 获得运行权后再读取日志和决定继续或回滚
+        self.__run_archive(self.__recover_jobs, schedule=False, kind="recover")
+
+    def __recover_jobs(self) -> Dict[ArchiveMapping, List[ArchiveJob]]:
+        """在恢复运行中读取未完成的归档，处理无需复制的条目，返回需要继续归档的任务"""
+        try:
+            entries = self._journal.pending()
+        except Exception as e:
+            logger.error(f"读取归档日志失败: {str(e)}")
+            return {}
+        if not entries:
+            return {}
+        logger.info(f"发现 {len(entries)} 个未完成的归档目录，开始恢复")
+        resume = []
+        for entry in entries:
+            job = entry.job
+            try:
+                source_exists = job.source.is_dir()
+                if entry.state == STATE_PLANNED:
+                    self._journal.finish(job)
+                elif entry.state == STATE_FAILED:
+                    # 运行中已失败的不继续移动（目录可能已不满足归档条件），回滚后由后续运行重新判断
+                    if source_exists:
+                        discard_partial(job.destination, entry.created_destination)
+                    self._journal.finish(job)
+                    logger.info(f"已回滚失败的归档: {job.source} -> {job.destination}")
+                elif entry.state == STATE_REMOVED or (entry.state == STATE_VERIFIED and not source_exists):
+                    self.__recovered(job)
+                elif entry.state == STATE_VERIFIED or (source_exists and self.__in_target(job)):
+                    logger.info(f"继续未完成的归档: {job.source} -> {job.destination}")
+                    resume.append(job)
+                elif source_exists:
+                    discard_partial(job.destination, entry.created_destination)
+                    self._journal.finish(job)
+                    logger.info(f"目标目录已不在当前配置中，已回滚未完成的归档: {job.source} -> {job.destination}")
+                else:
+                    self._journal.finish(job)
+                    logger.error(f"未完成的归档无法恢复，源目录已不存在: {job.source}，请手动检查 {job.destination}")
+            except Exception as e:
+                logger.error(f"恢复归档出错 {job.source}: {str(e)}")
+        return self.__group_jobs(resume)
+
+    def __in_target(self, job: ArchiveJob) -> bool:
+        """任务的目标目录是否仍位于源目录所属映射的目标目录下"""
+        mapping = find_mapping(self._mappings, job.source)
+        return bool(mapping) and mapping.target_dir in job.destination.parents
+
+    def __recovered(self, job: ArchiveJob):
+        """源目录已删除但未写入历史的归档，补写历史记录"""
+        logger.info(f"[恢复] {job.media_type}: {job.source.name} -> {job.destination} (归档已完成，补写历史记录)")
+        self.__save_history({
+            "create_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "media_type": job.media_type,
+            "media_name": job.source.name,
+            "source": str(job.source),
+            "target": str(job.destination),
+            "age_days": round(job.age_days, 1),
+            "threshold_days": job.threshold_days
+        })
+        self._journal.finish(job)
+
+    def __save_metrics(self):
+        """保存本次运行指标，只保留最近 METRICS_RUNS 次"""
+        if not self._metrics:
+            return
+        try:
+            run = self._metrics.to_dict()
+            self._metrics = None
+            runs = self.get_data("run_metrics") or []
+            runs.append(run)
+            self.save_data("run_metrics", runs[-self.METRICS_RUNS:])
+            counters = run["counters"]
+            logger.info(f"本次运行耗时 {run['seconds']:.1f} 秒：候选目录 {counters['candidates']} 个，"
+                        f"扫描目录 {counters['dirs_scanned']} 个（缓存命中 {counters['cache_hits']} 个），"
+                        f"移动 {counters['moves_ok']} 个，失败 {counters['moves_failed']} 个，"
+                        f"复制 {StringUtils.str_filesize(counters['bytes_moved'])}")
+        except Exception as e:
+            logger.error(f"保存运行指标失败: {str(e)}")
+
+    def __init_history(self):
+        """初始化历史记录存储，首次启动时导入旧版 transfer_history 数据"""
+        try:
+            self._history = HistoryStore(self.get_data_path() / "history.db")
+            migrated = self._history.migrate(lambda: self.get_data('transfer_history'))
+            if migrated:
+                logger.info(f"已导入 {migrated} 条旧版历史记录")
+        except Exception as e:
+            self._history = None
+            logger.error(f"初始化历史记录存储失败: {str(e)}")
 
     def __save_history(self, history: dict):
         """保存转移历史记录"""
         try:
-            # 获取现有历史记录
-            histories = self.get_data('transfer_history') or []
-            if not isinstance(histories, list):
-                histories = [histories]
-                
-            # 添加新记录
-            histories.append(history)
-            
-            # 保存更新后的历史记录
-            self.save_data('transfer_history', histories)
+            if not self._history:
+                logger.error(f"历史记录存储不可用，未写入: {history['media_name']}")
+                return
+            self._history.append(history)
             logger.info(f"已写入历史记录: {history['media_name']}")
-            
+
         except Exception as e:
             logger.error(f"保存历史记录失败: {str(e)}")
 
@@ -460,39 +1633,13 @@ class MediaArchive(_PluginBase):
             return
         
         try:
-            # 构建通知内容
-            message_lines = []
-            has_content = False
-            
-            # 添加成功记录
-            if self._transfer_messages["success"]:
-                has_content = True
-                message_lines.append("\n【成功转移】")
-                for msg in self._transfer_messages["success"]:
-                    message_lines.append(msg)
-                
-            # 添加跳过记录
-            if self._transfer_messages["skipped"]:
-                has_content = True
-                message_lines.append("\n【跳过处理】")
-                for msg in self._transfer_messages["skipped"]:
-                    message_lines.append(msg)
-                
-            # 添加失败记录
-            if self._transfer_messages["failed"]:
-                has_content = True
-                if message_lines:
-                    message_lines.append("")
-                message_lines.append("【处理失败】")
-                for msg in self._transfer_messages["failed"]:
-                    message_lines.append(msg)
-                    
-            # 如果有消息要发送
-            if has_content:
+            # 各分类按媒体类型和原因汇总数量，只列出前几条明细
+            text = self._report.render()
+            if text:
                 self.post_message(
                     mtype=NotificationType.SiteMessage,
                     title="【媒体归档处理结果】",
-                    text="\n".join(message_lines)
+                    text=text
                 )
             else:
                 logger.info("没有需要通知的内容")
@@ -516,55 +1663,132 @@ class MediaArchive(_PluginBase):
             "onlyonce": self._onlyonce,
             "test_mode": self._test_mode,
             "notify": self._notify,
+            "scan_cache": self._scan_cache,
+            "scan_cache_days": self._scan_cache_days,
+            "move_concurrency": self._move_concurrency,
+            "scan_workers": self._scan_workers,
+            "same_fs_mode": self._same_fs_mode,
+            "watch_mode": self._watch_mode,
+            "dedupe_mode": self._dedupe_mode,
+            "day_limit_mb": self._day_limit_mb,
+            "night_limit_mb": self._night_limit_mb,
+            "night_hours": self._night_hours,
+            "pause_mediaserver": self._pause_mediaserver,
+            "stream_limit_mb": self._stream_limit_mb,
+            "plan_mode": self._plan_mode,
+            "execute_cron": self._execute_cron,
+            "schedule_policy": self._schedule_policy,
+            "run_budget_gb": self._run_budget_gb,
+            "reserve_gb": self._reserve_gb,
             "cron": self._cron,
             "source_dir": self._source_dir,
             "target_dir": self._target_dir,
-            "thresholds_str": thresholds_str
+            "extra_mappings": self._extra_mappings,
+            "thresholds_str": thresholds_str,
+            "path_rules": self._path_rules
         })
 
+    @staticmethod
+    def __stat_card(title: str, value: Any, md: int = 3) -> dict:
+        """统计信息卡片"""
+        return {
+            'component': 'VCol',
+            'props': {
+                'cols': 12,
+                'md': md
+            },
+            'content': [{
+                'component': 'VCard',
+                'props': {
+                    'variant': 'tonal'
+                },
+                'content': [{
+                    'component': 'VCardText',
+                    'content': [{
+                        'component': 'div',
+                        'content': [
+                            {
+                                'component': 'div',
+                                'props': {'class': 'text-subtitle-2'},
+                                'text': title
+                            },
+                            {
+                                'component': 'div',
+                                'props': {'class': 'text-h6'},
+                                'text': str(value)
+                            }
+                        ]
+                    }]
+                }]
+            }]
+        }
+
+    def __status_cards(self) -> List[dict]:
+        """运行状态卡片：当前运行的进度和预计剩余时间、排队的运行、上次运行"""
+        status = self._coordinator.status()
+        running = status["running"]
+        if running:
+            progress = f"{running['done']}/{running['total']}" + ("+（扫描中）" if running["scanning"] else "")
+            if running["eta_seconds"] is not None:
+                progress += f"，预计剩余 {self.__format_duration(running['eta_seconds'])}"
+            cards = [
+                self.__stat_card(f"运行中：{RUN_KINDS.get(running['kind'], running['kind'])}"
+                                 f"（{running['start_time']} 开始）", progress, md=6)
+            ]
+        else:
+            cards = [self.__stat_card("运行状态", "空闲")]
+        if status["pending"]:
+            cards.append(self.__stat_card("排队中", "、".join(RUN_KINDS.get(kind, kind)
+                                                            for kind in status["pending"])))
+        last = status["last"]
+        if last:
+            cards.append(self.__stat_card(f"上次运行：{RUN_KINDS.get(last['kind'], last['kind'])}（{last['end_time']} 结束）",
+                                          f"{last['done']} 个目录，失败 {last['failed']} 个，"
+                                          f"耗时 {self.__format_duration(last['seconds'])}", md=6))
+        return cards
+
+    @staticmethod
+    def __format_duration(seconds: float) -> str:
+        """格式化时长"""
+        seconds = int(seconds)
+        if seconds < 60:
+            return f"{seconds}秒"
+        if seconds < 3600:
+            return f"{seconds // 60}分{seconds % 60}秒"
+        return f"{seconds // 3600}小时{seconds % 3600 // 60}分"
+
     def get_page(self) -> List[dict]:
         """插件页面 - 显示归档处理历史记录"""
-        # 获取历史数据
-        histories = self.get_data('transfer_history') or []
+        # 只取最近一页记录，统计数据由索引直接汇总
+        histories = self._history.query(limit=self.PAGE_SIZE) if self._history else []
+        totals = self._history.totals() if self._history else {}
+        try:
+            plan = load_plan(self.__plan_path())
+        except Exception as e:
+            logger.error(f"读取归档计划失败: {str(e)}")
+            plan = None
 
         return [
+            # 运行状态
+            {
+                'component': 'VRow',
+                'content': self.__status_cards()
+            },
             # 统计信息卡片
             {
                 'component': 'VRow',
                 'content': [
                     # 总处理数量
-                    {
-                        'component': 'VCol',
-                        'props': {
-                            'cols': 12,
-                            'md': 4
-                        },
-                        'content': [{
-                            'component': 'VCard',
-                            'props': {
-                                'variant': 'tonal'
-                            },
-                            'content': [{
-                                'component': 'VCardText',
-                                'content': [{
-                                    'component': 'div',
-                                    'content': [
-                                        {
-                                            'component': 'div',
-                                            'props': {'class': 'text-subtitle-2'},
-                                            'text': '总处理数量'
-                                        },
-                                        {
-                                            'component': 'div',
-                                            'props': {'class': 'text-h6'},
-                                            'text': str(len(histories))
-                                        }
-                                    ]
-                                }]
-                            }]
-                        }]
-                    }
-                ]
+                    self.__stat_card('总处理数量', sum(totals.values()))
+                ] + [
+                    # 各媒体类型数量
+                    self.__stat_card(media_type, count) for media_type, count in totals.items()
+                ] + ([
+                    # 待执行的归档计划
+                    self.__stat_card(f"待执行计划（{plan.get('create_time')}）",
+                                     f"{len(plan.get('items') or [])} 个目录 / "
+                                     f"{StringUtils.str_filesize(plan.get('total_size') or 0)}", md=6)
+                ] if plan else [])
             },
             # 转移历史记录表格
             {
@@ -581,6 +1805,10 @@ class MediaArchive(_PluginBase):
                                 'component': 'VCardTitle',
                                 'content': '转移历史记录'
                             },
+                            {
+                                'component': 'VCardSubtitle',
+                                'text': f'显示最近 {self.PAGE_SIZE} 条，更多记录请通过 API /history 分页查询'
+                            },
                             {
                                 'component': 'VCardText',
                                 'content': [{
@@ -648,10 +1876,7 @@ class MediaArchive(_PluginBase):
                                                             'text': str(history.get('age_days', '未知'))
                                                         }
                                                     ]
-                                                } for history in sorted(histories,
-                                                                      key=lambda x: datetime.strptime(x.get('create_time', '1970-01-01 00:00:00'),
-                                                                                            '%Y-%m-%d %H:%M:%S'),
-                                                                      reverse=True)
+                                                } for history in histories
                                             ]
                                         }
                                     ]
@@ -665,11 +1890,162 @@ class MediaArchive(_PluginBase):
 
     def get_api(self) -> List[Dict[str, Any]]:
         """返回API接口配置"""
-        return []
+        return [{
+            "path": "/status",
+            "endpoint": self.api_status,
+            "methods": ["GET"],
+            "summary": "查询运行状态",
+            "description": "返回当前运行的进度和预计剩余时间、排队的运行及上次运行结果"
+        }, {
+            "path": "/run",
+            "endpoint": self.api_run,
+            "methods": ["POST"],
+            "summary": "立即运行",
+            "description": "在后台开始一次归档，已有运行时排队，同类请求合并"
+        }, {
+            "path": "/history",
+            "endpoint": self.api_history,
+            "methods": ["GET"],
+            "summary": "查询归档历史记录",
+            "description": "按媒体类型、日期范围分页查询归档历史记录，按时间倒序"
+        }, {
+            "path": "/plan",
+            "endpoint": self.api_plan,
+            "methods": ["GET"],
+            "summary": "查看归档计划",
+            "description": "返回当前待执行的归档计划"
+        }, {
+            "path": "/plan/create",
+            "endpoint": self.api_create_plan,
+            "methods": ["POST"],
+            "summary": "生成归档计划",
+            "description": "后台扫描并生成新的归档计划"
+        }, {
+            "path": "/plan/execute",
+            "endpoint": self.api_execute_plan,
+            "methods": ["POST"],
+            "summary": "执行归档计划",
+            "description": "后台执行当前待执行的归档计划"
+        }, {
+            "path": "/metrics",
+            "endpoint": self.api_metrics,
+            "methods": ["GET"],
+            "summary": "查询运行指标",
+            "description": "返回最近几次运行的各阶段耗时、计数和各目录传输速度，按时间倒序"
+        }, {
+            "path": "/metrics/prometheus",
+            "endpoint": self.api_metrics_prometheus,
+            "methods": ["GET"],
+            "summary": "Prometheus 格式运行指标",
+            "description": "以 Prometheus 文本格式返回各类运行中最近一次的指标"
+        }]
+
+    def api_plan(self) -> Dict[str, Any]:
+        """查看归档计划"""
+        try:
+            plan = load_plan(self.__plan_path())
+        except Exception as e:
+            return {"success": False, "message": f"读取归档计划失败: {str(e)}"}
+        if not plan:
+            return {"success": True, "plan": None}
+        items = [{
+            "media_type": job.media_type,
+            "source": str(job.source),
+            "target": str(job.destination),
+            "age_days": job.age_days,
+            "threshold": f"{job.threshold_days}#{job.mtime_days}",
+            "size": job.size
+        } for job in plan_jobs(plan)]
+        return {
+            "success": True,
+            "plan": {
+                "create_time": plan.get("create_time"),
+                "source_dir": plan.get("source_dir"),
+                "target_dir": plan.get("target_dir"),
+                "total_size": plan.get("total_size"),
+                "items": items
+            }
+        }
+
+    def api_status(self) -> Dict[str, Any]:
+        """查询运行状态"""
+        return {"success": True, **self._coordinator.status()}
+
+    def api_run(self) -> Dict[str, Any]:
+        """后台立即运行一次归档"""
+        return self.__run_response("archive")
+
+    def api_create_plan(self) -> Dict[str, Any]:
+        """后台生成归档计划"""
+        return self.__run_response("plan")
+
+    def api_execute_plan(self) -> Dict[str, Any]:
+        """后台执行归档计划"""
+        return self.__run_response("execute")
+
+    def __run_response(self, kind: str) -> Dict[str, Any]:
+        """请求运行并返回接口结果"""
+        messages = {
+            "started": f"已开始{RUN_KINDS[kind]}",
+            "queued": f"已有归档任务正在运行，{RUN_KINDS[kind]}已排队",
+            "merged": f"{RUN_KINDS[kind]}已在排队中"
+        }
+        result = self.run_now(kind)
+        return {"success": True, "result": result, "message": messages[result]}
+
+    def api_metrics(self, count: int = 10) -> Dict[str, Any]:
+        """查询最近几次运行的指标"""
+        try:
+            count = min(max(int(count or 10), 1), self.METRICS_RUNS)
+        except (TypeError, ValueError):
+            count = 10
+        runs = self.get_data("run_metrics") or []
+        return {"success": True, "runs": list(reversed(runs[-count:]))}
+
+    def api_metrics_prometheus(self) -> PlainTextResponse:
+        """Prometheus 文本格式的运行指标"""
+        return PlainTextResponse(to_prometheus(self.get_data("run_metrics") or []),
+                                 media_type="text/plain; version=0.0.4")
+
+    def api_history(self, page: int = 1, count: int = 50, media_type: str = None,
+                    start: str = None, end: str = None) -> Dict[str, Any]:
+        """
+        分页查询归档历史记录
+        start/end 支持 YYYY-MM-DD 或 YYYY-MM-DD HH:MM:SS 格式
+        """
+        if not self._history:
+            return {"success": False, "message": "历史记录存储不可用"}
+        try:
+            page = max(int(page or 1), 1)
+        except (TypeError, ValueError):
+            page = 1
+        try:
+            count = min(max(int(count or 50), 1), 500)
+        except (TypeError, ValueError):
+            count = 50
+        if start and len(start) == 10:
+            start = f"{start} 00:00:00"
+        if end and len(end) == 10:
+            end = f"{end} 23:59:59"
+        return {
+            "success": True,
+            "page": page,
+            "count": count,
+            "total": self._history.count(media_type=media_type, start=start, end=end),
+            "totals": self._history.totals(),
+            "items": self._history.query(media_type=media_type, start=start, end=end,
+                                         limit=count, offset=(page - 1) * count)
+        }
 
     def stop_service(self):
         """停止插件服务"""
         try:
+            self._coordinator.clear()
+            if self._limiter:
+                self._limiter.stop()
+            for watcher in self._watchers:
+                watcher.stop()
+            self._watchers = []
             if self._scheduler:
                 logger.info("正在停止插件服务...")
                 self._scheduler.remove_all_jobs()
@@ -0,0 +1,181 @@
+"""
+运行协调
+定时任务、立即运行、目录监控、计划执行和中断恢复共用一把运行锁，同一时间只有一个归档过程；
+非阻塞的立即运行在忙碌时排队，同类请求合并为一次，当前运行结束后自动开始，
+运行期间记录状态、进度和预计剩余时间供页面和接口展示
+"""
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, Optional, Set
+
+from app.log import logger
+
+# 运行类型
+RUN_KINDS = {
+    "archive": "归档",
+    "watch": "目录监控",
+    "plan": "生成计划",
+    "execute": "执行计划",
+    "recover": "恢复中断的归档"
+}
+
+
+class RunProgress:
+    """单次运行的进度，可被多个线程同时更新"""
+
+    def __init__(self, kind: str):
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._first_job: Optional[float] = None
+        self.kind = kind
+        self.start_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # 扫描期间任务总数未知，所有扫描流水线结束后才能估算剩余时间
+        self.scanning = True
+        self._scans = 1
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+        self.active: Set[str] = set()
+
+    def add_job(self):
+        """判断出一个需要处理的目录"""
+        with self._lock:
+            self.total += 1
+
+    def expect_scans(self, count: int):
+        """设置并行扫描的流水线数量（每组目录映射一个）"""
+        with self._lock:
+            self._scans = max(int(count), 1)
+
+    def scan_finished(self):
+        """一条流水线的候选目录判断完成，全部完成后任务总数确定"""
+        with self._lock:
+            self._scans -= 1
+            self.scanning = self._scans > 0
+
+    def start_job(self, name: str):
+        """开始处理目录"""
+        with self._lock:
+            if self._first_job is None:
+                self._first_job = time.monotonic()
+            self.active.add(name)
+
+    def end_job(self, name: str, failed: bool = False):
+        """目录处理完成"""
+        with self._lock:
+            self.active.discard(name)
+            self.done += 1
+            if failed:
+                self.failed += 1
+
+    def eta_seconds(self) -> Optional[float]:
+        """按已完成目录的平均耗时估算剩余时间，扫描未结束或尚无完成的目录时返回 None"""
+        with self._lock:
+            if self.scanning or not self.done or self._first_job is None:
+                return None
+            remaining = max(self.total - self.done, 0)
+            return (time.monotonic() - self._first_job) / self.done * remaining
+
+    def to_dict(self) -> Dict[str, Any]:
+        eta = self.eta_seconds()
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "start_time": self.start_time,
+                "seconds": round(time.monotonic() - self._started, 1),
+                "scanning": self.scanning,
+                "total": self.total,
+                "done": self.done,
+                "failed": self.failed,
+                "active": sorted(self.active),
+                "eta_seconds": round(eta) if eta is not None else None
+            }
+
+
+class RunCoordinator:
+    """
+    运行协调器
+    run: 阻塞等待运行权，用于目录监控、中断恢复等需要立即处理的调用
+    request: 非阻塞地请求一次运行，空闲时在后台线程开始，忙碌时排队，同类请求合并
+    """
+
+    def __init__(self):
+        self._run_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._current: Optional[RunProgress] = None
+        self._last: Optional[Dict[str, Any]] = None
+        # 排队的运行：类型 -> 运行函数，按请求顺序执行
+        self._pending: Dict[str, Callable[[], None]] = {}
+        # 已启动后台线程但尚未结束，期间的请求同样排队
+        self._launching = False
+
+    @contextmanager
+    def run(self, kind: str) -> Iterator[RunProgress]:
+        """获得运行权并记录运行状态，结束后开始排队的运行"""
+        with self._run_lock:
+            progress = RunProgress(kind)
+            with self._lock:
+                self._current = progress
+            try:
+                yield progress
+            finally:
+                with self._lock:
+                    self._current = None
+                    self._last = {**progress.to_dict(), "end_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+        self.__drain()
+
+    def request(self, kind: str, func: Callable[[], None]) -> str:
+        """
+        请求一次运行，返回 started（已开始）、queued（已排队）或 merged（已合并到排队中的同类运行）
+        """
+        with self._lock:
+            if self._current or self._launching:
+                merged = kind in self._pending
+                self._pending[kind] = func
+                return "merged" if merged else "queued"
+            self._launching = True
+        self.__start(func)
+        return "started"
+
+    def clear(self):
+        """清空排队的运行"""
+        with self._lock:
+            self._pending.clear()
+
+    def status(self) -> Dict[str, Any]:
+        """当前运行、排队和上次运行的状态"""
+        with self._lock:
+            current = self._current
+            pending = list(self._pending)
+            last = self._last
+        return {
+            "running": current.to_dict() if current else None,
+            "pending": pending,
+            "last": last
+        }
+
+    def __start(self, func: Callable[[], None]):
+        threading.Thread(target=self.__launch, args=(func,), name="mediaarchive-run", daemon=True).start()
+
+    def __launch(self, func: Callable[[], None]):
+        try:
+            func()
+        except Exception as e:
+            logger.error(f"归档运行出错: {str(e)}")
+        finally:
+            with self._lock:
+                self._launching = False
+            self.__drain()
+
+    def __drain(self):
+        """空闲时开始下一个排队的运行"""
+        with self._lock:
+            if self._current or self._launching or not self._pending:
+                return
+            kind = next(iter(self._pending))
+            func = self._pending.pop(kind)
+            self._launching = True
+        logger.info(f"开始排队的运行：{RUN_KINDS.get(kind, kind)}")
+        self.__start(func)
@@ -0,0 +1,177 @@
+"""
+目标目录内容索引
+以 (文件大小, 头/中/尾数据块哈希) 为键记录目标目录中的大文件，
+归档时源文件与目标目录中已有文件内容相同则改为硬链接或直接跳过，不再重复复制
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+from app.log import logger
+
+# 重复文件处理方式
+DEDUPE_MODES = {
+    "link": "硬链接",
+    "skip": "跳过"
+}
+
+
+class ContentIndex:
+    """目标目录内容索引"""
+    # 只索引不小于该大小的文件，小文件直接复制的代价低于计算哈希
+    MIN_SIZE = 64 * 1024 * 1024
+    # 参与哈希的数据块大小，分别取文件头部、中部和尾部
+    BLOCK_SIZE = 1024 * 1024
+    # 全量刷新间隔（秒），期间新归档的文件会直接写入索引
+    REFRESH_SECONDS = 24 * 3600
+
+    def __init__(self, db_path: Path):
+        self._db_path = Path(db_path)
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        # 本次运行中未命中索引、即将复制的文件：目标路径 -> (大小, 哈希)
+        self._pending: Dict[str, Tuple[int, str]] = {}
+        self.__init_db()
+
+    @contextmanager
+    def __connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self._db_path, timeout=30)
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def __init_db(self):
+        """创建数据表和索引"""
+        self._db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.__connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    digest TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_files_key ON files (size, digest)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    @classmethod
+    def digest(cls, path: Path, size: int) -> str:
+        """计算文件头部、中部、尾部数据块的哈希"""
+        hasher = hashlib.blake2b(digest_size=16)
+        hasher.update(str(size).encode())
+        offsets = {0, max(size // 2 - cls.BLOCK_SIZE // 2, 0), max(size - cls.BLOCK_SIZE, 0)}
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            for offset in sorted(offsets):
+                hasher.update(os.pread(fd, cls.BLOCK_SIZE, offset))
+        finally:
+            os.close(fd)
+        return hasher.hexdigest()
+
+    def find(self, src: Path, dst: Path, root: Path = None) -> Optional[Path]:
+        """
+        查找与源文件内容相同的目标文件，找到时返回其路径，root 不为空时只查找该目录下的文件
+        未找到时记录源文件的哈希，复制完成后由 commit 写入索引
+        """
+        size = os.stat(src).st_size
+        if size < self.MIN_SIZE:
+            return None
+        digest = self.digest(src, size)
+        with self.__connect() as conn:
+            rows = conn.execute("SELECT path, mtime_ns FROM files WHERE size = ? AND digest = ?",
+                                (size, digest)).fetchall()
+        prefix = os.path.join(os.fspath(root), "") if root else ""
+        for path, mtime_ns in rows:
+            if not path.startswith(prefix):
+                continue
+            # 索引中的文件可能已被修改或删除
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if stat.st_size == size and stat.st_mtime_ns == mtime_ns and path != str(dst):
+                return Path(path)
+        with self._lock:
+            self._pending[str(dst)] = (size, digest)
+        return None
+
+    def commit(self):
+        """将本次复制完成的文件写入索引"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        rows = []
+        for path, (size, digest) in pending.items():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if stat.st_size == size:
+                rows.append((path, size, stat.st_mtime_ns, digest))
+        if rows:
+            with self.__connect() as conn:
+                conn.executemany("INSERT OR REPLACE INTO files (path, size, mtime_ns, digest) VALUES (?, ?, ?, ?)",
+                                 rows)
+
+    def is_stale(self) -> bool:
+        """距上次全量刷新是否已超过刷新间隔"""
+        with self.__connect() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'refresh_time'").fetchone()
+        return not row or time.time() - float(row[0]) > self.REFRESH_SECONDS
+
+    def refresh(self, *target_dirs: Path):
+        """
+        增量刷新索引：遍历所有目标目录，只对新增或大小、修改时间变化的文件计算哈希，删除已不存在的文件
+        同一时间只运行一个刷新
+        """
+        if not self._refreshing.acquire(blocking=False):
+            return
+        try:
+            started = time.time()
+            with self.__connect() as conn:
+                known = {path: (size, mtime_ns) for path, size, mtime_ns
+                         in conn.execute("SELECT path, size, mtime_ns FROM files")}
+            seen = set()
+            updated = []
+            pending = [os.fspath(target_dir) for target_dir in target_dirs]
+            while pending:
+                current = pending.pop()
+                try:
+                    with os.scandir(current) as entries:
+                        for entry in entries:
+                            if entry.is_dir(follow_symlinks=False):
+                                pending.append(entry.path)
+                                continue
+                            if not entry.is_file(follow_symlinks=False):
+                                continue
+                            stat = entry.stat(follow_symlinks=False)
+                            if stat.st_size < self.MIN_SIZE:
+                                continue
+                            seen.add(entry.path)
+                            if known.get(entry.path) == (stat.st_size, stat.st_mtime_ns):
+                                continue
+                            try:
+                                updated.append((entry.path, stat.st_size, stat.st_mtime_ns,
+                                                self.digest(Path(entry.path), stat.st_size)))
+                            except OSError as e:
+                                logger.warning(f"计算文件哈希失败 {entry.path}: {str(e)}")
+                except OSError as e:
+                    logger.warning(f"刷新内容索引时无法读取目录 {current}: {str(e)}")
+            removed = [(path,) for path in known if path not in seen]
+            with self.__connect() as conn:
+                conn.executemany("INSERT OR REPLACE INTO files (path, size, mtime_ns, digest) VALUES (?, ?, ?, ?)",
+                                 updated)
+                conn.executemany("DELETE FROM files WHERE path = ?", removed)
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('refresh_time', ?)", (str(started),))
+            logger.info(f"内容索引刷新完成：共 {len(seen)} 个文件，更新 {len(updated)} 个，移除 {len(removed)} 个，"
+                        f"耗时 {time.time() - started:.1f} 秒")
+        finally:
+            self._refreshing.release()
@@ -0,0 +1,144 @@
+"""
+归档历史存储
+使用 SQLite（WAL 模式）按追加方式写入，按时间和媒体类型建立索引，避免每次写入都读写整个历史列表
+"""
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+
+class HistoryStore:
+    """归档历史存储"""
+    # 独立存储的字段，其余字段以 JSON 保存在 extra 中
+    COLUMNS = ("create_time", "media_type", "media_name", "source", "target",
+               "age_days", "threshold_days", "bytes", "seconds")
+
+    def __init__(self, db_path: Path):
+        self._db_path = Path(db_path)
+        self._lock = threading.Lock()
+        self.__init_db()
+
+    @contextmanager
+    def __connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self._db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def __init_db(self):
+        """创建数据表和索引"""
+        self._db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.__connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS transfer_history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    create_time TEXT NOT NULL,
+                    media_type TEXT,
+                    media_name TEXT,
+                    source TEXT,
+                    target TEXT,
+                    age_days REAL,
+                    threshold_days INTEGER,
+                    bytes INTEGER,
+                    seconds REAL,
+                    extra TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_history_time ON transfer_history (create_time)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_history_type_time "
+                         "ON transfer_history (media_type, create_time)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def __row_values(self, record: Dict[str, Any]) -> tuple:
+        """将历史记录转换为数据行"""
+        extra = {key: value for key, value in record.items() if key not in self.COLUMNS}
+        return tuple(record.get(column) for column in self.COLUMNS) + \
+            (json.dumps(extra, ensure_ascii=False) if extra else None,)
+
+    def append(self, record: Dict[str, Any]):
+        """追加一条历史记录"""
+        self.append_many([record])
+
+    def append_many(self, records: Iterable[Dict[str, Any]]):
+        """批量追加历史记录"""
+        with self._lock, self.__connect() as conn:
+            self.__insert(conn, records)
+
+    def __insert(self, conn: sqlite3.Connection, records: Iterable[Dict[str, Any]]):
+        """在给定连接的事务中写入记录"""
+        placeholders = ", ".join("?" * (len(self.COLUMNS) + 1))
+        sql = f"INSERT INTO transfer_history ({', '.join(self.COLUMNS)}, extra) VALUES ({placeholders})"
+        conn.executemany(sql, (self.__row_values(record) for record in records))
+
+    @staticmethod
+    def __where(media_type: Optional[str], start: Optional[str], end: Optional[str]) -> tuple:
+        """构建查询条件，时间为 %Y-%m-%d %H:%M:%S 格式字符串，可按字典序比较"""
+        clauses, params = [], []
+        if media_type:
+            clauses.append("media_type = ?")
+            params.append(media_type)
+        if start:
+            clauses.append("create_time >= ?")
+            params.append(start)
+        if end:
+            clauses.append("create_time <= ?")
+            params.append(end)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, media_type: Optional[str] = None, start: Optional[str] = None,
+              end: Optional[str] = None, limit: Optional[int] = None, offset: int = 0) -> List[Dict[str, Any]]:
+        """按时间倒序查询历史记录"""
+        where, params = self.__where(media_type, start, end)
+        sql = f"SELECT * FROM transfer_history{where} ORDER BY create_time DESC, id DESC"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params += [int(limit), int(offset)]
+        with self.__connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        records = []
+        for row in rows:
+            record = {column: row[column] for column in self.COLUMNS if row[column] is not None}
+            if row["extra"]:
+                record.update(json.loads(row["extra"]))
+            records.append(record)
+        return records
+
+    def count(self, media_type: Optional[str] = None, start: Optional[str] = None,
+              end: Optional[str] = None) -> int:
+        """统计历史记录数量"""
+        where, params = self.__where(media_type, start, end)
+        with self.__connect() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM transfer_history{where}", params).fetchone()[0]
+
+    def totals(self) -> Dict[str, int]:
+        """按媒体类型统计历史记录数量"""
+        with self.__connect() as conn:
+            rows = conn.execute("SELECT media_type, COUNT(*) FROM transfer_history "
+                                "GROUP BY media_type ORDER BY COUNT(*) DESC").fetchall()
+        return {row[0] or "未知": row[1] for row in rows}
+
+    def migrate(self, load_records: Callable[[], Optional[list]]) -> int:
+        """
+        从旧版 transfer_history 列表一次性导入，已导入过时不再读取旧数据，直接返回0
+        导入与标记在同一事务中完成，中途失败不会重复导入
+        返回导入的记录数
+        """
+        with self._lock, self.__connect() as conn:
+            if conn.execute("SELECT value FROM meta WHERE key = 'migrated'").fetchone():
+                return 0
+            records = load_records()
+            if records and not isinstance(records, list):
+                records = [records]
+            records = [record for record in records or [] if isinstance(record, dict)]
+            for record in records:
+                record.setdefault("create_time", "1970-01-01 00:00:00")
+            self.__insert(conn, records)
+            conn.execute("INSERT INTO meta (key, value) VALUES ('migrated', '1')")
+        return len(records)
@@ -0,0 +1,136 @@
+"""
+归档日志
+记录每个目录的归档进度（已计划 / 复制中 / 已校验 / 已删除源目录），
+进程中途退出后，启动时据此继续或回滚未完成的目录，无需重新扫描和复制；
+运行中已捕获的失败标记为已失败，启动时只回滚不继续，由后续运行按阈值重新判断
+"""
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, List, NamedTuple
+
+from app.plugins.mediaarchive.mover import ArchiveJob
+
+# 归档状态
+STATE_PLANNED = "planned"
+STATE_COPYING = "copying"
+STATE_VERIFIED = "verified"
+STATE_REMOVED = "source-removed"
+STATE_FAILED = "failed"
+
+JOURNAL_STATES = {
+    STATE_PLANNED: "已计划",
+    STATE_COPYING: "复制中",
+    STATE_VERIFIED: "已校验",
+    STATE_REMOVED: "已删除源目录",
+    STATE_FAILED: "已失败"
+}
+
+
+class JournalEntry(NamedTuple):
+    """未完成的归档记录"""
+    job: ArchiveJob
+    state: str
+    created_destination: bool   # 目标目录是否由本次归档创建，回滚时据此决定能否整体删除
+    update_time: str
+
+
+class RunJournal:
+    """归档日志，每个源目录一条记录，归档完成后删除"""
+
+    def __init__(self, db_path: Path):
+        self._db_path = Path(db_path)
+        self._lock = threading.Lock()
+        self.__init_db()
+
+    @contextmanager
+    def __connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self._db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def __init_db(self):
+        """创建数据表"""
+        self._db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.__connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS journal (
+                    source TEXT PRIMARY KEY,
+                    destination TEXT NOT NULL,
+                    media_type TEXT,
+                    age_days REAL,
+                    threshold_days INTEGER,
+                    mtime_days INTEGER,
+                    size INTEGER,
+                    state TEXT NOT NULL,
+                    created_destination INTEGER NOT NULL,
+                    update_time TEXT NOT NULL
+                )
+            """)
+
+    @staticmethod
+    def __now() -> str:
+        return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def plan(self, job: ArchiveJob):
+        """记录即将归档的目录，已有记录（上次未完成）时保留其目标目录创建标记，上次失败的重新从已计划开始"""
+        created = not job.destination.exists()
+        with self._lock, self.__connect() as conn:
+            conn.execute("""
+                INSERT INTO journal (source, destination, media_type, age_days, threshold_days,
+                                     mtime_days, size, state, created_destination, update_time)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (source) DO UPDATE SET
+                    destination = excluded.destination,
+                    media_type = excluded.media_type,
+                    age_days = excluded.age_days,
+                    threshold_days = excluded.threshold_days,
+                    mtime_days = excluded.mtime_days,
+                    size = excluded.size,
+                    state = CASE WHEN journal.state = ? THEN excluded.state ELSE journal.state END,
+                    update_time = excluded.update_time
+            """, (str(job.source), str(job.destination), job.media_type, job.age_days, job.threshold_days,
+                  job.mtime_days, job.size, STATE_PLANNED, int(created), self.__now(), STATE_FAILED))
+
+    def update(self, job: ArchiveJob, state: str):
+        """更新归档状态"""
+        with self._lock, self.__connect() as conn:
+            conn.execute("UPDATE journal SET state = ?, update_time = ? WHERE source = ?",
+                         (state, self.__now(), str(job.source)))
+
+    def fail(self, job: ArchiveJob):
+        """归档失败；已校验的不改变状态，启动时继续删除源目录"""
+        with self._lock, self.__connect() as conn:
+            conn.execute("UPDATE journal SET state = ?, update_time = ? WHERE source = ? AND state IN (?, ?)",
+                         (STATE_FAILED, self.__now(), str(job.source), STATE_PLANNED, STATE_COPYING))
+
+    def finish(self, job: ArchiveJob):
+        """归档完成，删除记录"""
+        with self._lock, self.__connect() as conn:
+            conn.execute("DELETE FROM journal WHERE source = ?", (str(job.source),))
+
+    def pending(self) -> List[JournalEntry]:
+        """所有未完成的归档记录"""
+        with self.__connect() as conn:
+            rows = conn.execute("SELECT * FROM journal ORDER BY update_time").fetchall()
+        return [JournalEntry(
+            job=ArchiveJob(
+                media_type=row["media_type"],
+                source=Path(row["source"]),
+                destination=Path(row["destination"]),
+                age_days=row["age_days"] or 0,
+                threshold_days=row["threshold_days"] or 0,
+                mtime_days=row["mtime_days"] or 0,
+                size=row["size"] or 0
+            ),
+            state=row["state"],
+            created_destination=bool(row["created_destination"]),
+            update_time=row["update_time"]
+        ) for row in rows]
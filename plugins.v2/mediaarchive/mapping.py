@@ -0,0 +1,61 @@
+"""
+目录映射
+一个插件可配置多组 源目录 => 目标目录，每组有独立的移动并发数和阈值，
+归档时各组的扫描流水线和移动线程池并行运行，互不等待
+"""
+from pathlib import Path
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+
+class ArchiveMapping(NamedTuple):
+    """源目录到目标目录的映射"""
+    source_dir: Path
+    target_dir: Path
+    move_concurrency: int = 1
+    # 覆盖全局阈值配置的同类型阈值：((媒体类型, 创建时间, 修改时间), ...)
+    thresholds: Tuple[Tuple[str, int, int], ...] = ()
+
+    def thresholds_of(self, media_type: str) -> List[Tuple[int, int]]:
+        """该映射为媒体类型单独配置的阈值，未配置时为空"""
+        return [(creation_days, mtime_days) for name, creation_days, mtime_days in self.thresholds
+                if name == media_type]
+
+
+def parse_mapping(line: str, move_concurrency: int = 1) -> ArchiveMapping:
+    """
+    解析映射配置，格式：源目录=>目标目录[|移动并发数][|媒体类型#创建时间#修改时间]...
+    例如：/mnt/disk2/media=>/mnt/cloud/media|2|电影#60#60|电视剧#30#120
+    """
+    parts = [part.strip() for part in line.strip().split("|")]
+    source, sep, target = parts[0].partition("=>")
+    source, target = source.strip(), target.strip()
+    if not sep or not source or not target:
+        raise ValueError("格式应为 源目录=>目标目录")
+    thresholds = []
+    for part in parts[1:]:
+        if not part:
+            continue
+        if part.isdigit():
+            move_concurrency = max(int(part), 1)
+            continue
+        media_type, creation_days, mtime_days = part.split("#")
+        thresholds.append((media_type.strip(), int(creation_days), int(mtime_days)))
+    return ArchiveMapping(source_dir=Path(source), target_dir=Path(target),
+                          move_concurrency=move_concurrency, thresholds=tuple(thresholds))
+
+
+def find_mapping(mappings: Iterable[ArchiveMapping], path: Path) -> Optional[ArchiveMapping]:
+    """返回路径所属源目录的映射"""
+    path = Path(path)
+    for mapping in mappings:
+        if path == mapping.source_dir or mapping.source_dir in path.parents:
+            return mapping
+    return None
+
+
+def overlaps(mapping: ArchiveMapping, others: Iterable[ArchiveMapping]) -> Optional[ArchiveMapping]:
+    """返回源目录与该映射相同或互相包含的映射，同一目录不能由两个映射处理"""
+    for other in others:
+        if find_mapping([other], mapping.source_dir) or find_mapping([mapping], other.source_dir):
+            return other
+    return None
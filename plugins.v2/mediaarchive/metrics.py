@@ -0,0 +1,125 @@
+"""
+运行指标
+记录每次归档各阶段耗时（遍历、扫描、判断、移动）、计数（扫描目录数、stat 次数、移动字节数、失败数等）
+及每个目录的传输速度，可导出为 JSON 或 Prometheus 文本格式
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, TypeVar
+
+T = TypeVar("T")
+
+# 阶段：遍历候选目录 / 扫描目录（scandir、stat） / 判断（含扫描） / 移动（各目录移动耗时之和）
+PHASES = ("enumerate", "stat", "decide", "move")
+
+COUNTERS = ("candidates", "dirs_scanned", "cache_hits", "stats", "jobs", "skipped", "deferred",
+            "moves_ok", "moves_failed", "bytes_moved")
+
+
+class RunMetrics:
+    """单次运行的指标，可被多个线程同时写入"""
+    # 每次运行最多记录的目录传输明细
+    MAX_JOBS = 200
+
+    def __init__(self, kind: str):
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self.kind = kind
+        self.start_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.phases: Dict[str, float] = dict.fromkeys(PHASES, 0.0)
+        self.counters: Dict[str, int] = dict.fromkeys(COUNTERS, 0)
+        self.jobs: List[Dict[str, Any]] = []
+
+    def add(self, phase: str = None, seconds: float = 0.0, **counters: int):
+        """累加阶段耗时和计数"""
+        with self._lock:
+            if phase:
+                self.phases[phase] += seconds
+            for name, value in counters.items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def timed(self, phase: str, func: Callable[..., T], *args) -> T:
+        """调用函数并计入阶段耗时"""
+        started = time.monotonic()
+        try:
+            return func(*args)
+        finally:
+            self.add(phase, time.monotonic() - started)
+
+    def iterate(self, phase: str, iterable: Iterable[T], counter: str = None) -> Iterator[T]:
+        """逐项迭代并把取下一项的耗时计入阶段耗时"""
+        iterator = iter(iterable)
+        while True:
+            started = time.monotonic()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(phase, time.monotonic() - started)
+                return
+            if counter:
+                self.add(phase, time.monotonic() - started, **{counter: 1})
+            else:
+                self.add(phase, time.monotonic() - started)
+            yield item
+
+    def record_job(self, name: str, media_type: str, size: int, seconds: float, method: str):
+        """记录单个目录的传输结果"""
+        self.add("move", seconds, moves_ok=1, bytes_moved=size)
+        with self._lock:
+            if len(self.jobs) < self.MAX_JOBS:
+                self.jobs.append({
+                    "name": name,
+                    "media_type": media_type,
+                    "bytes": size,
+                    "seconds": round(seconds, 3),
+                    "speed": round(size / seconds) if seconds > 0 else 0,
+                    "method": method
+                })
+
+    def to_dict(self) -> Dict[str, Any]:
+        """结束运行，返回可保存的指标"""
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "start_time": self.start_time,
+                "end_timestamp": round(time.time(), 3),
+                "seconds": round(time.monotonic() - self._started, 3),
+                "phases": {phase: round(seconds, 3) for phase, seconds in self.phases.items()},
+                "counters": dict(self.counters),
+                "jobs": list(self.jobs)
+            }
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def to_prometheus(runs: List[Dict[str, Any]], prefix: str = "mediaarchive") -> str:
+    """导出各类运行中最近一次的指标，Prometheus 文本格式（均为 gauge）"""
+    latest: Dict[str, Dict[str, Any]] = {}
+    for run in runs:
+        kind = run.get("kind") or "archive"
+        if kind not in latest or run.get("end_timestamp", 0) >= latest[kind].get("end_timestamp", 0):
+            latest[kind] = run
+
+    lines = []
+
+    def metric(name: str, help_text: str, samples: List[tuple]):
+        lines.append(f"# HELP {prefix}_{name} {help_text}")
+        lines.append(f"# TYPE {prefix}_{name} gauge")
+        for labels, value in samples:
+            label_str = ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+            lines.append(f"{prefix}_{name}{{{label_str}}} {value}")
+
+    metric("last_run_timestamp_seconds", "Unix time the last run finished",
+           [({"kind": kind}, run.get("end_timestamp", 0)) for kind, run in latest.items()])
+    metric("last_run_duration_seconds", "Wall time of the last run",
+           [({"kind": kind}, run.get("seconds", 0)) for kind, run in latest.items()])
+    metric("last_run_phase_seconds", "Time spent per phase in the last run, summed across threads",
+           [({"kind": kind, "phase": phase}, seconds)
+            for kind, run in latest.items() for phase, seconds in (run.get("phases") or {}).items()])
+    for counter in COUNTERS:
+        metric(f"last_run_{counter}", f"{counter} in the last run",
+               [({"kind": kind}, (run.get("counters") or {}).get(counter, 0)) for kind, run in latest.items()])
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,64 @@
+"""
+归档移动执行器
+按源/目标设备分组并行执行目录移动，同一组设备内限制并发，避免多个任务争抢同一块磁盘
+"""
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, NamedTuple, Tuple, Any
+
+
+class ArchiveJob(NamedTuple):
+    """归档任务"""
+    media_type: str       # 媒体类型
+    source: Path          # 源目录
+    destination: Path     # 目标目录
+    age_days: float       # 创建时间（天）
+    threshold_days: int   # 命中的创建时间阈值（天）
+    mtime_days: int = 0   # 命中的修改时间阈值（天）
+    size: int = 0         # 目录大小（字节），未统计时为0
+
+
+def device_of(path: Path) -> int:
+    """获取路径所在设备，路径不存在时使用最近的已存在上级目录"""
+    current = Path(path)
+    while True:
+        try:
+            return os.stat(current).st_dev
+        except FileNotFoundError:
+            if current.parent == current:
+                raise
+            current = current.parent
+
+
+class MoveExecutor:
+    """
+    按 (源设备, 目标设备) 分组的移动线程池
+    不同设备组之间并行，同一设备组内最多同时执行 concurrency 个任务
+    """
+
+    def __init__(self, move_func: Callable[[ArchiveJob], Any], concurrency: int = 1):
+        self._move_func = move_func
+        self._concurrency = max(int(concurrency), 1)
+        self._pools: Dict[Tuple[int, int], ThreadPoolExecutor] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, job: ArchiveJob) -> Future:
+        """提交归档任务，返回的 Future 结果为移动函数的返回值"""
+        key = (device_of(job.source), device_of(job.destination.parent))
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = ThreadPoolExecutor(max_workers=self._concurrency,
+                                          thread_name_prefix=f"mediaarchive-{key[0]}-{key[1]}")
+                self._pools[key] = pool
+        return pool.submit(self._move_func, job)
+
+    def shutdown(self, wait: bool = True):
+        """关闭所有线程池"""
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+        for pool in pools:
+            pool.shutdown(wait=wait)
@@ -0,0 +1,104 @@
+"""
+扫描流水线
+枚举线程逐个产出候选目录写入有界队列，多个判断线程并行判断，满足条件的任务按完成顺序交给调用方移动
+队列满时上游阻塞等待，内存占用与媒体库规模无关，第一个目录判断完成即可开始移动
+"""
+import queue
+import threading
+from typing import Callable, Generic, Iterable, Iterator, Optional, TypeVar
+
+from app.log import logger
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_DONE = object()
+
+
+class ScanPipeline(Generic[T, R]):
+    """
+    生产者/消费者流水线
+    source: 候选目录生成器，在枚举线程中迭代
+    decide: 判断函数，返回 None 表示不处理，在判断线程中并行调用
+    """
+    # 队列阻塞时检查是否已停止的间隔（秒）
+    POLL_SECONDS = 0.5
+
+    def __init__(self, source: Iterable[T], decide: Callable[[T], Optional[R]],
+                 workers: int = 2, queue_size: int = 256):
+        self._source = source
+        self._decide = decide
+        self._workers = max(int(workers), 1)
+        self._queue_size = max(int(queue_size), 1)
+        self._stop = threading.Event()
+
+    def __iter__(self) -> Iterator[R]:
+        """启动流水线并逐个返回判断结果，提前结束迭代时通知所有线程退出"""
+        inbox: queue.Queue = queue.Queue(maxsize=self._queue_size)
+        outbox: queue.Queue = queue.Queue(maxsize=self._queue_size)
+        threads = [threading.Thread(target=self.__produce, args=(inbox,),
+                                    name="mediaarchive-scan", daemon=True)]
+        threads.extend(threading.Thread(target=self.__work, args=(inbox, outbox),
+                                        name=f"mediaarchive-decide-{i}", daemon=True)
+                       for i in range(self._workers))
+        for thread in threads:
+            thread.start()
+        try:
+            finished = 0
+            while finished < self._workers:
+                item = outbox.get()
+                if item is _DONE:
+                    finished += 1
+                    continue
+                yield item
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join(timeout=self.POLL_SECONDS * 4)
+
+    def __put(self, target: queue.Queue, item) -> bool:
+        """写入有界队列，已停止时放弃写入并返回 False"""
+        while not self._stop.is_set():
+            try:
+                target.put(item, timeout=self.POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def __produce(self, inbox: queue.Queue):
+        """枚举线程：遍历候选目录"""
+        try:
+            for item in self._source:
+                if not self.__put(inbox, item):
+                    return
+        except Exception as e:
+            logger.error(f"遍历候选目录出错: {str(e)}")
+        finally:
+            # 提前停止时关闭生成器，释放其中打开的目录句柄
+            close = getattr(self._source, "close", None)
+            if close:
+                close()
+            for _ in range(self._workers):
+                if not self.__put(inbox, _DONE):
+                    break
+
+    def __work(self, inbox: queue.Queue, outbox: queue.Queue):
+        """判断线程：逐个判断候选目录"""
+        try:
+            while not self._stop.is_set():
+                try:
+                    item = inbox.get(timeout=self.POLL_SECONDS)
+                except queue.Empty:
+                    continue
+                if item is _DONE:
+                    return
+                try:
+                    result = self._decide(item)
+                except Exception as e:
+                    logger.error(f"判断目录出错 {item}: {str(e)}")
+                    continue
+                if result is not None and not self.__put(outbox, result):
+                    return
+        finally:
+            self.__put(outbox, _DONE)
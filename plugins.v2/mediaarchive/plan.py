@@ -0,0 +1,78 @@
+"""
+归档计划
+将判断结果写入计划文件，执行阶段直接读取计划移动目录，无需重新扫描
+路径以相对源目录保存，目标路径由目标目录拼接得到；配置多组目录映射时每个条目记录所属映射的序号
+"""
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.plugins.mediaarchive.mover import ArchiveJob
+
+
+def save_plan(path: Path, mappings: Sequence[Tuple[Path, Path]], jobs: List[ArchiveJob],
+              create_time: Optional[str] = None):
+    """
+    写入计划文件，mappings 为 (源目录, 目标目录) 列表，任务的源目录必须位于其中之一
+    create_time 为空时记为当前时间，执行后保留未完成的条目时沿用原计划的生成时间
+    """
+    roots = [Path(source_dir) for source_dir, _ in mappings]
+
+    def mapping_index(job: ArchiveJob) -> int:
+        for index, root in enumerate(roots):
+            if root in job.source.parents:
+                return index
+        raise ValueError(f"目录不在任何源目录中: {job.source}")
+
+    items = []
+    for job in jobs:
+        index = mapping_index(job)
+        items.append([job.media_type, job.source.relative_to(roots[index]).as_posix(), round(job.age_days, 1),
+                      job.threshold_days, job.mtime_days, job.size, index])
+    plan = {
+        "create_time": create_time or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "source_dir": str(mappings[0][0]) if mappings else "",
+        "target_dir": str(mappings[0][1]) if mappings else "",
+        "mappings": [[str(source_dir), str(target_dir)] for source_dir, target_dir in mappings],
+        "total_size": sum(job.size for job in jobs),
+        # [媒体类型, 相对路径, 创建时间(天), 创建时间阈值, 修改时间阈值, 大小, 映射序号]
+        "items": items
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(plan, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def load_plan(path: Path) -> Optional[Dict[str, Any]]:
+    """读取计划文件，不存在时返回 None"""
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def plan_mappings(plan: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """计划生成时的 (源目录, 目标目录) 列表，兼容只有一组目录的旧版计划"""
+    return [(source_dir, target_dir) for source_dir, target_dir
+            in plan.get("mappings") or [[plan["source_dir"], plan["target_dir"]]]]
+
+
+def plan_jobs(plan: Dict[str, Any]) -> Iterator[ArchiveJob]:
+    """将计划转换为归档任务"""
+    roots = [(Path(source_dir), Path(target_dir)) for source_dir, target_dir in plan_mappings(plan)]
+    for item in plan.get("items") or []:
+        media_type, relative_path, age_days, creation_days, mtime_days, size = item[:6]
+        source_root, target_root = roots[item[6] if len(item) > 6 else 0]
+        yield ArchiveJob(
+            media_type=media_type,
+            source=source_root / relative_path,
+            destination=target_root / relative_path,
+            age_days=age_days,
+            threshold_days=creation_days,
+            mtime_days=mtime_days,
+            size=size
+        )
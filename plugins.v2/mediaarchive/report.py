@@ -0,0 +1,86 @@
+"""
+运行结果汇总
+逐条累加各分类下按 (媒体类型, 原因) 的计数，每个分类只保留权重最大的前 N 条明细，
+内存占用和通知长度都与目录数量无关
+"""
+import heapq
+import itertools
+import threading
+from typing import Dict, List, Tuple
+
+# 分类：通知中的标题和明细的排序说明
+REPORT_CATEGORIES = {
+    "success": ("成功转移", "最大的"),
+    "deferred": ("延后处理", "最大的"),
+    "skipped": ("跳过处理", "创建最早的"),
+    "failed": ("处理失败", "最先出现的")
+}
+
+
+class RunReport:
+    """单次运行的结果汇总，可被多个线程同时写入"""
+    # 每个分类保留的明细条数
+    TOP_N = 10
+
+    def __init__(self, top_n: int = TOP_N):
+        self._lock = threading.Lock()
+        self._top_n = max(int(top_n), 0)
+        self._seq = itertools.count()
+        # (分类, 媒体类型, 原因) -> 数量
+        self._counts: Dict[Tuple[str, str, str], int] = {}
+        # 分类 -> 最小堆 [(权重, -序号, 明细)]，权重相同时保留先出现的
+        self._top: Dict[str, List[Tuple[float, int, str]]] = {}
+
+    def add(self, category: str, media_type: str, reason: str, text: str, weight: float = 0.0):
+        """
+        记录一条结果
+        weight 决定明细是否保留：成功和延后为目录大小，跳过为创建天数，失败为 0（保留最先出现的）
+        """
+        with self._lock:
+            key = (category, media_type, reason)
+            self._counts[key] = self._counts.get(key, 0) + 1
+            if not self._top_n:
+                return
+            heap = self._top.setdefault(category, [])
+            item = (float(weight), -next(self._seq), text)
+            if len(heap) < self._top_n:
+                heapq.heappush(heap, item)
+            else:
+                heapq.heappushpop(heap, item)
+
+    def count(self, category: str) -> int:
+        """分类下的总数"""
+        with self._lock:
+            return sum(count for (cat, _, _), count in self._counts.items() if cat == category)
+
+    def items(self, category: str) -> List[str]:
+        """分类下保留的明细，按权重从大到小"""
+        with self._lock:
+            return [text for _, _, text in sorted(self._top.get(category, []), reverse=True)]
+
+    def breakdown(self, category: str) -> Dict[str, Dict[str, int]]:
+        """分类下按媒体类型、原因统计的数量"""
+        result: Dict[str, Dict[str, int]] = {}
+        with self._lock:
+            for (cat, media_type, reason), count in sorted(self._counts.items()):
+                if cat == category:
+                    result.setdefault(media_type, {})[reason] = count
+        return result
+
+    def render(self) -> str:
+        """生成通知内容，没有任何记录时返回空字符串"""
+        sections = []
+        for category, (title, order) in REPORT_CATEGORIES.items():
+            total = self.count(category)
+            if not total:
+                continue
+            lines = [f"【{title}】共 {total} 个"]
+            for media_type, reasons in self.breakdown(category).items():
+                lines.append(f"{media_type}: " + "，".join(f"{reason} {count}" for reason, count in reasons.items()))
+            items = self.items(category)
+            if items:
+                if total > len(items):
+                    lines.append(f"{order} {len(items)} 个:")
+                lines.extend(items)
+            sections.append("\n".join(lines))
+        return "\n\n".join(sections)
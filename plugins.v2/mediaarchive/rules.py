@@ -0,0 +1,148 @@
+"""
+路径规则
+将 "路径模式#媒体类型" 规则编译为按目录层级组织的前缀树，
+判断路径所属候选目录只需沿路径走一遍，遍历源目录时也只进入规则引用到的目录
+"""
+import os
+from fnmatch import fnmatchcase
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+# 默认规则，与旧版固定的目录结构一致
+DEFAULT_RULES = "电视剧/*/*#电视剧\n动漫/完结动漫/*#完结动漫\n电影/*/*#电影\n综艺/*#综艺"
+
+_WILDCARDS = set("*?[")
+
+
+class PathRule(NamedTuple):
+    """路径规则"""
+    index: int                  # 规则顺序，多条规则同时匹配时靠前的优先
+    pattern: str                # 相对源目录的路径模式，每级目录支持 * ? [] 通配符
+    media_type: str             # 媒体类型
+    thresholds: Tuple[Tuple[int, int], ...] = ()  # 规则专属阈值 (创建时间, 修改时间)，为空时使用媒体类型的阈值
+
+
+def parse_rule(index: int, line: str) -> PathRule:
+    """解析单行规则，格式：路径模式#媒体类型[#创建时间#修改时间...]，可写多组阈值"""
+    fields = [field.strip() for field in line.strip().split("#")]
+    if len(fields) < 2 or len(fields) % 2 or not fields[0] or not fields[1]:
+        raise ValueError("格式应为 路径模式#媒体类型[#创建时间#修改时间]")
+    pattern = "/".join(part for part in fields[0].split("/") if part)
+    if not pattern:
+        raise ValueError("路径模式不能为空")
+    thresholds = tuple((int(fields[i]), int(fields[i + 1])) for i in range(2, len(fields), 2))
+    return PathRule(index=index, pattern=pattern, media_type=fields[1], thresholds=thresholds)
+
+
+def _is_wildcard(segment: str) -> bool:
+    return any(char in _WILDCARDS for char in segment)
+
+
+def _segment_match(name: str, segment: str) -> bool:
+    """单级目录匹配，与 Path.glob 一致，通配符不匹配隐藏目录"""
+    if name.startswith(".") and not segment.startswith("."):
+        return False
+    return fnmatchcase(name, segment)
+
+
+class _Node:
+    __slots__ = ("literals", "wildcards", "rule", "first")
+
+    def __init__(self):
+        self.literals: Dict[str, "_Node"] = {}
+        self.wildcards: Dict[str, "_Node"] = {}
+        self.rule: Optional[PathRule] = None
+        # 子树中最靠前的规则顺序，决定遍历顺序
+        self.first = 0
+
+
+class RuleTrie:
+    """路径规则前缀树，每个节点对应一级目录，固定名称与通配符分开存放"""
+
+    def __init__(self, rules: Iterable[PathRule]):
+        self._root = _Node()
+        self._rules: List[PathRule] = []
+        for rule in sorted(rules, key=lambda r: r.index):
+            self.__add(rule)
+        self.__index(self._root)
+
+    @property
+    def rules(self) -> List[PathRule]:
+        return list(self._rules)
+
+    def __add(self, rule: PathRule):
+        node = self._root
+        for segment in rule.pattern.split("/"):
+            children = node.wildcards if _is_wildcard(segment) else node.literals
+            node = children.setdefault(segment, _Node())
+        # 模式重复时保留靠前的规则
+        if node.rule is None:
+            node.rule = rule
+            self._rules.append(rule)
+
+    def match(self, parts: Sequence[str]) -> Optional[Tuple[int, PathRule]]:
+        """
+        沿相对路径逐级匹配，返回 (候选目录层级数, 规则)
+        路径可以位于候选目录之下，多条规则匹配时取顺序最靠前的规则
+        """
+        best: Optional[Tuple[int, PathRule]] = None
+        nodes = [self._root]
+        for depth, name in enumerate(parts, start=1):
+            next_nodes = []
+            for node in nodes:
+                child = node.literals.get(name)
+                if child:
+                    next_nodes.append(child)
+                next_nodes.extend(child for segment, child in node.wildcards.items()
+                                  if _segment_match(name, segment))
+            nodes = next_nodes
+            for node in nodes:
+                if node.rule and (best is None or node.rule.index < best[1].index):
+                    best = (depth, node.rule)
+            if not nodes:
+                break
+        return best
+
+    def walk(self, root: Path) -> Iterator[Tuple[Path, PathRule]]:
+        """
+        遍历源目录下的候选目录
+        固定名称的层级直接拼接路径，只有通配符层级才列出目录；目录列表逐项读取，不整体载入内存
+        """
+        root = Path(root)
+        yield from self.__walk(self._root, root, ())
+
+    def __walk(self, node: _Node, root: Path, parts: Tuple[str, ...]) -> Iterator[Tuple[Path, PathRule]]:
+        if node.rule:
+            matched = self.match(parts)
+            # 只在命中规则所在的节点返回，与 match 的判定保持一致，同一目录经多条路径到达时也只返回一次
+            if matched and matched[0] == len(parts) and matched[1].index == node.rule.index:
+                yield root.joinpath(*parts), matched[1]
+        # 按子树中最靠前的规则顺序进入下一级
+        for name, child in sorted(node.literals.items(), key=lambda item: item[1].first):
+            if os.path.isdir(root.joinpath(*parts, name)):
+                yield from self.__walk(child, root, parts + (name,))
+        if not node.wildcards:
+            return
+        wildcards = sorted(node.wildcards.items(), key=lambda item: item[1].first)
+        try:
+            entries = os.scandir(root.joinpath(*parts))
+        except OSError:
+            return
+        with entries:
+            for entry in entries:
+                try:
+                    if not entry.is_dir():
+                        continue
+                except OSError:
+                    continue
+                for segment, child in wildcards:
+                    if _segment_match(entry.name, segment):
+                        yield from self.__walk(child, root, parts + (entry.name,))
+
+    def __index(self, node: _Node) -> int:
+        """计算各节点子树中最靠前的规则顺序"""
+        indexes = [node.rule.index] if node.rule else []
+        indexes.extend(self.__index(child) for child in node.literals.values())
+        indexes.extend(self.__index(child) for child in node.wildcards.values())
+        node.first = min(indexes) if indexes else 0
+        return node.first
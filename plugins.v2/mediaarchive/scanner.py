@@ -0,0 +1,206 @@
+"""
+目录扫描
+单次遍历候选目录，汇总视频文件信息，供所有阈值配置共用
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import NamedTuple, Iterable, Optional, List, Dict, Tuple
+
+from app.log import logger
+from app.plugins.mediaarchive.metrics import RunMetrics
+
+
+class DirectorySummary(NamedTuple):
+    """目录扫描结果"""
+    newest_mtime: float           # 最新视频文件的修改时间（时间戳，无视频文件时为0）
+    video_count: int              # 视频文件数量
+    size: Optional[int] = None    # 目录下所有文件的总大小（字节），未统计时为 None
+
+    def has_recent(self, mtime_days: int, now: float) -> bool:
+        """是否存在修改时间在阈值内的视频文件"""
+        if not self.video_count:
+            return False
+        return (now - self.newest_mtime) / 86400 < mtime_days
+
+
+class DirectoryNode(NamedTuple):
+    """单个目录（不含子目录）的统计结果"""
+    newest_mtime: float           # 直属视频文件的最新修改时间
+    video_count: int              # 直属视频文件数量
+    subdirs: List[str]            # 子目录名称
+    size: Optional[int] = None    # 直属文件总大小，未统计时为 None
+
+
+class DirectoryScanner:
+    """基于 os.scandir 的目录扫描器"""
+
+    def __init__(self, video_extensions: Iterable[str]):
+        self._video_extensions = {ext.lower() for ext in video_extensions}
+
+    def is_video(self, name: str) -> bool:
+        """根据扩展名判断是否为视频文件"""
+        return os.path.splitext(name)[1].lower() in self._video_extensions
+
+    def scan(self, directory: os.PathLike, cache: "FingerprintCache" = None,
+             with_size: bool = False, metrics: RunMetrics = None) -> DirectorySummary:
+        """
+        遍历目录树一次，返回最新视频修改时间和视频文件数量
+        with_size 为 True 时同时统计所有文件的总大小（需要 stat 每个文件）
+        不跟随目录软链接，与 Path.rglob 的行为保持一致
+        提供指纹缓存时，指纹未变化的目录直接使用缓存结果，不再列出和统计其中的文件
+        提供运行指标时记录扫描耗时、列出的目录数、缓存命中数和 stat 次数
+        """
+        started = time.monotonic()
+        newest_mtime = 0.0
+        video_count = 0
+        size = 0
+        listed = hits = stats = 0
+        pending = [os.fspath(directory)]
+        while pending:
+            current = pending.pop()
+            dir_stat = None
+            node = None
+            if cache is not None:
+                dir_stat = os.stat(current)
+                stats += 1
+                node = cache.lookup(current, dir_stat, with_size)
+            if node is None:
+                node, entry_stats = self.__scan_entries(current, with_size)
+                listed += 1
+                stats += entry_stats
+                if cache is not None:
+                    cache.store(current, dir_stat, node)
+            else:
+                hits += 1
+            pending.extend(os.path.join(current, name) for name in node.subdirs)
+            video_count += node.video_count
+            newest_mtime = max(newest_mtime, node.newest_mtime)
+            if with_size:
+                size += node.size
+        if metrics:
+            metrics.add("stat", time.monotonic() - started, dirs_scanned=listed, cache_hits=hits, stats=stats)
+        return DirectorySummary(newest_mtime=newest_mtime, video_count=video_count,
+                                size=size if with_size else None)
+
+    def __scan_entries(self, directory: str, with_size: bool) -> Tuple[DirectoryNode, int]:
+        """列出单个目录，统计直属视频文件及（可选）所有直属文件大小，同时返回 stat 次数"""
+        newest_mtime = 0.0
+        video_count = 0
+        size = 0
+        stats = 0
+        subdirs = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+                    continue
+                is_video = self.is_video(entry.name)
+                if not is_video and not with_size:
+                    continue
+                if not entry.is_file():
+                    continue
+                entry_stat = entry.stat()
+                stats += 1
+                size += entry_stat.st_size
+                if is_video:
+                    video_count += 1
+                    if entry_stat.st_mtime > newest_mtime:
+                        newest_mtime = entry_stat.st_mtime
+        return DirectoryNode(newest_mtime=newest_mtime, video_count=video_count,
+                             subdirs=subdirs, size=size if with_size else None), stats
+
+
+class FingerprintCache:
+    """
+    目录指纹缓存
+    以目录路径为键，记录目录修改时间、链接数（多数文件系统上即子目录数+2）、子目录列表
+    及直属视频文件的最新修改时间、数量和直属文件总大小
+    目录内增删、重命名文件都会改变目录修改时间，指纹一致时即可直接使用缓存结果
+    可被多个判断线程同时使用
+    """
+    VERSION = 2
+    # 目录修改时间距扫描时刻过近时不写入缓存，避免同一时间粒度内的后续变化被漏判
+    RACY_SECONDS = 2
+
+    def __init__(self, path: Path, max_age_days: int = 7):
+        self._path = Path(path)
+        self._max_age = max(max_age_days, 0) * 86400
+        self._entries: Dict[str, list] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        """从磁盘加载缓存"""
+        entries = {}
+        try:
+            if self._path.exists():
+                with open(self._path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == self.VERSION:
+                    entries = data.get("entries") or {}
+        except Exception as e:
+            logger.warning(f"读取目录指纹缓存失败，将重新扫描: {str(e)}")
+        with self._lock:
+            self._entries = entries
+            self._dirty = False
+
+    def save(self):
+        """写回磁盘，丢弃超过有效期的条目"""
+        now = time.time()
+        with self._lock:
+            expired = [key for key, entry in self._entries.items() if now - entry[6] > self._max_age]
+            for key in expired:
+                del self._entries[key]
+            if not self._dirty and not expired:
+                return
+            entries = dict(self._entries)
+            self._dirty = False
+        try:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self._path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": self.VERSION, "entries": entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path)
+        except Exception as e:
+            with self._lock:
+                self._dirty = True
+            logger.error(f"保存目录指纹缓存失败: {str(e)}")
+
+    def lookup(self, path: str, dir_stat: os.stat_result, with_size: bool = False) -> Optional[DirectoryNode]:
+        """指纹一致且未过期时返回缓存的目录统计结果，需要大小但缓存中未统计时视为未命中"""
+        with self._lock:
+            entry = self._entries.get(path)
+            if not entry:
+                return None
+            mtime_ns, newest, videos, subdirs, size, nlink, checked = entry
+            if mtime_ns != dir_stat.st_mtime_ns or nlink != dir_stat.st_nlink:
+                del self._entries[path]
+                self._dirty = True
+                return None
+        if time.time() - checked > self._max_age or (with_size and size is None):
+            return None
+        return DirectoryNode(newest_mtime=newest, video_count=videos, subdirs=subdirs, size=size)
+
+    def store(self, path: str, dir_stat: os.stat_result, node: DirectoryNode):
+        """记录目录指纹及统计结果"""
+        now = time.time()
+        with self._lock:
+            if now - dir_stat.st_mtime < self.RACY_SECONDS:
+                self._entries.pop(path, None)
+                return
+            self._entries[path] = [dir_stat.st_mtime_ns, node.newest_mtime, node.video_count, node.subdirs,
+                                   node.size, dir_stat.st_nlink, now]
+            self._dirty = True
+
+    def discard_tree(self, path: str):
+        """移除目录及其子目录的缓存（目录被移走后调用）"""
+        prefix = path.rstrip(os.sep) + os.sep
+        with self._lock:
+            keys = [key for key in self._entries if key == path or key.startswith(prefix)]
+            for key in keys:
+                del self._entries[key]
+            if keys:
+                self._dirty = True
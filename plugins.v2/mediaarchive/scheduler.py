@@ -0,0 +1,111 @@
+"""
+归档调度
+根据目录大小、目标剩余空间和单次运行的数据量上限选择本次归档的目录，其余延后到下次运行
+只有跨设备（需要复制数据）的任务占用空间和额度，同设备重命名/克隆/硬链接的任务始终执行；
+多组目录映射并行调度时共用一份额度：数据量上限每次运行一份，剩余空间每个目标文件系统一份
+"""
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.log import logger
+from app.plugins.mediaarchive.mover import ArchiveJob, device_of
+
+# 调度策略
+SCHEDULE_POLICIES = {
+    "oldest": "最早优先",
+    "largest": "最大优先",
+    "bestfit": "最佳填充"
+}
+
+
+def free_bytes(path: Path) -> int:
+    """目标路径所在文件系统的可用空间，路径不存在时使用最近的已存在上级目录"""
+    current = Path(path)
+    while not current.exists() and current.parent != current:
+        current = current.parent
+    stat = os.statvfs(current)
+    return stat.f_bavail * stat.f_frsize
+
+
+class SpaceBudget:
+    """
+    一次运行的空间额度，所有目录映射的调度共用，可被多个线程同时使用
+    写入同一文件系统的映射共用该文件系统的剩余空间，数据量上限由所有映射共用
+    """
+
+    def __init__(self, run_budget: Optional[int] = None, reserve: int = 0):
+        """
+        :param run_budget: 本次运行最多复制的字节数，None 为不限制
+        :param reserve: 目标文件系统至少保留的字节数
+        """
+        self._lock = threading.Lock()
+        self._run_remaining = run_budget
+        self._reserve = reserve
+        # 文件系统设备号 -> 剩余可用字节数，None 表示无法获取剩余空间、不检查
+        self._free: Dict[int, Optional[int]] = {}
+
+    def available(self, target: Path) -> Optional[int]:
+        """写入 target 时当前可用的字节数，不限制时返回 None"""
+        with self._lock:
+            return self.__available(target)
+
+    def take(self, target: Path, size: int) -> bool:
+        """额度足够时扣减并返回 True，否则不扣减返回 False"""
+        with self._lock:
+            available = self.__available(target)
+            if available is not None and size > available:
+                return False
+            if self._run_remaining is not None:
+                self._run_remaining -= size
+            device = self.__device(target)
+            if self._free.get(device) is not None:
+                self._free[device] -= size
+            return True
+
+    def __device(self, target: Path) -> int:
+        """目标所在文件系统，首次使用时读取其剩余空间"""
+        device = device_of(target)
+        if device not in self._free:
+            try:
+                self._free[device] = free_bytes(target) - self._reserve
+            except OSError as e:
+                logger.warning(f"获取目标剩余空间失败，不检查剩余空间: {str(e)}")
+                self._free[device] = None
+        return device
+
+    def __available(self, target: Path) -> Optional[int]:
+        limits = [limit for limit in (self._run_remaining, self._free[self.__device(target)]) if limit is not None]
+        return max(min(limits), 0) if limits else None
+
+
+def schedule_jobs(jobs: Iterable[ArchiveJob], policy: str, take: Optional[Callable[[ArchiveJob], bool]],
+                  needs_space: Callable[[ArchiveJob], bool]) -> Tuple[List[ArchiveJob], List[ArchiveJob]]:
+    """
+    按策略排序并在额度内选择任务，返回 (本次执行, 延后执行)
+    oldest / largest 严格按优先级，遇到放不下的任务即停止，避免大目录一直被小目录插队；
+    bestfit 按大小从大到小尽量填满额度
+    take 在额度足够时扣减任务大小并返回 True；为 None 时不限制额度，只排序
+    """
+    jobs = list(jobs)
+    if policy == "largest" or policy == "bestfit":
+        jobs.sort(key=lambda job: job.size, reverse=True)
+    else:
+        jobs.sort(key=lambda job: job.age_days, reverse=True)
+    if take is None:
+        return jobs, []
+
+    selected, deferred = [], []
+    blocked = False
+    for job in jobs:
+        if not needs_space(job):
+            selected.append(job)
+            continue
+        if not blocked and take(job):
+            selected.append(job)
+            continue
+        deferred.append(job)
+        if policy != "bestfit":
+            blocked = True
+    return selected, deferred
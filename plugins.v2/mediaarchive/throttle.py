@@ -0,0 +1,134 @@
+"""
+传输限速
+令牌桶限制所有移动线程的总复制速度，白天/夜间分别设置速度上限，
+媒体服务器有用户正在播放时降速或暂停，播放结束后自动恢复
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Optional, Tuple
+
+from app.log import logger
+
+
+def parse_hours(value: str) -> Optional[Tuple[int, int]]:
+    """解析时间段，格式：开始小时-结束小时，如 1-8、23-6，格式错误时返回 None"""
+    try:
+        start, end = (int(part) for part in str(value).strip().split("-"))
+    except (TypeError, ValueError):
+        return None
+    if not (0 <= start <= 23 and 0 <= end <= 24) or start == end:
+        return None
+    return start, end
+
+
+class TokenBucket:
+    """
+    令牌桶
+    允许一秒的突发量，令牌不足时记为欠额，调用方按欠额休眠，多个线程共享同一总速度
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens = 0.0
+        self._last = time.monotonic()
+
+    def reserve(self, size: int, rate: float) -> float:
+        """预占 size 字节，返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._tokens + (now - self._last) * rate, rate)
+            self._last = now
+            self._tokens -= size
+            return -self._tokens / rate if self._tokens < 0 else 0.0
+
+
+class BandwidthLimiter:
+    """
+    按时间段和播放状态限速
+    速度单位为字节/秒，None 表示不限速，0 表示暂停
+    """
+    # 暂停时检查是否恢复的间隔（秒）
+    PAUSE_POLL_SECONDS = 10
+    # 播放状态的缓存时间（秒），避免每个数据块都请求媒体服务器
+    STREAM_CHECK_SECONDS = 30
+
+    def __init__(self, day_rate: Optional[float], night_rate: Optional[float],
+                 night_hours: Optional[Tuple[int, int]] = None,
+                 is_streaming: Optional[Callable[[], bool]] = None,
+                 stream_rate: Optional[float] = 0):
+        self._day_rate = day_rate
+        self._night_rate = night_rate
+        self._night_hours = night_hours
+        self._is_streaming = is_streaming
+        self._stream_rate = stream_rate
+        self._bucket = TokenBucket()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._streaming = False
+        self._checked: Optional[float] = None
+        self._paused = False
+
+    @property
+    def enabled(self) -> bool:
+        return self._day_rate is not None or self._night_rate is not None or self._is_streaming is not None
+
+    def stop(self):
+        """停止限速器，正在等待的传输会中断"""
+        self._stop.set()
+
+    def is_night(self, now: datetime = None) -> bool:
+        """当前是否处于夜间时段"""
+        if not self._night_hours:
+            return False
+        hour = (now or datetime.now()).hour
+        start, end = self._night_hours
+        if start < end:
+            return start <= hour < end
+        return hour >= start or hour < end
+
+    def __streaming(self) -> bool:
+        """媒体服务器是否有正在播放的会话，结果缓存一段时间，查询失败时视为没有播放"""
+        if not self._is_streaming:
+            return False
+        with self._lock:
+            if self._checked is not None and time.monotonic() - self._checked < self.STREAM_CHECK_SECONDS:
+                return self._streaming
+            self._checked = time.monotonic()
+        try:
+            streaming = bool(self._is_streaming())
+        except Exception as e:
+            logger.warning(f"查询媒体服务器播放状态失败: {str(e)}")
+            streaming = False
+        with self._lock:
+            self._streaming = streaming
+        return streaming
+
+    def current_rate(self) -> Optional[float]:
+        """当前适用的速度上限"""
+        rate = self._night_rate if self.is_night() else self._day_rate
+        if self.__streaming():
+            if rate is None or (self._stream_rate is not None and self._stream_rate < rate):
+                rate = self._stream_rate
+        return rate
+
+    def acquire(self, size: int):
+        """传输 size 字节前调用，按当前速度上限等待；暂停期间阻塞，限速器停止时抛出 InterruptedError"""
+        while True:
+            if self._stop.is_set():
+                raise InterruptedError("归档已停止")
+            rate = self.current_rate()
+            if rate is None:
+                return
+            if rate > 0:
+                break
+            if not self._paused:
+                self._paused = True
+                logger.info("媒体服务器正在播放，暂停归档传输")
+            self._stop.wait(self.PAUSE_POLL_SECONDS)
+        if self._paused:
+            self._paused = False
+            logger.info("恢复归档传输")
+        wait = self._bucket.reserve(size, rate)
+        if wait > 0 and self._stop.wait(wait):
+            raise InterruptedError("归档已停止")
@@ -0,0 +1,318 @@
+"""
+目录传输
+同一文件系统内按配置使用重命名、reflink 克隆或硬链接，均不可用时才复制数据
+复制使用内核态复制（copy_file_range / sendfile）写入 .partial 临时文件，中断后可从已校验位置续传
+临时文件的大小和尾部数据与源文件一致、且复制期间源文件未被修改时才替换为目标文件，全部完成后才删除源目录
+"""
+import errno
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from app.plugins.mediaarchive.journal import STATE_COPYING, STATE_REMOVED, STATE_VERIFIED
+from app.plugins.mediaarchive.mover import device_of
+
+PARTIAL_SUFFIX = ".partial"
+# 同文件系统归档方式
+ARCHIVE_MODES = {
+    "rename": "重命名",
+    "reflink": "reflink克隆",
+    "hardlink": "硬链接"
+}
+# 与目标目录中已有文件内容相同、未复制数据的文件
+DEDUPE_METHOD = "dedupe"
+# linux/fs.h: FICLONE = _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+# 表示当前文件系统不支持某种方式的错误码，遇到后改用下一种方式
+UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL,
+                      errno.ENOSYS, errno.EPERM, errno.EMLINK}
+# 单次内核复制的最大字节数
+CHUNK_SIZE = 64 * 1024 * 1024
+# 限速时单次复制的最大字节数，数据块越小限速越平滑
+THROTTLE_CHUNK_SIZE = 4 * 1024 * 1024
+# 续传前和复制完成后用于校验的尾部数据长度
+VERIFY_SIZE = 1024 * 1024
+# 修改时间校验容差（秒），网盘挂载等文件系统的时间精度可能只到秒
+MTIME_TOLERANCE = 2
+
+
+class TransferResult(NamedTuple):
+    """传输结果"""
+    bytes_copied: int   # 实际复制的字节数（续传、克隆、硬链接不计入）
+    seconds: float      # 耗时（秒）
+    method: str         # 实际使用的方式：rename / reflink / hardlink / copy / dedupe，混用时以+连接
+
+    @property
+    def speed(self) -> float:
+        """平均速度（字节/秒）"""
+        return self.bytes_copied / self.seconds if self.seconds > 0 else 0.0
+
+
+def format_speed(speed: float) -> str:
+    """格式化传输速度"""
+    return f"{speed / 1024 / 1024:.1f} MB/s"
+
+
+def _kernel_copy(src_fd: int, dst_fd: int, offset: int, count: int) -> int:
+    """从 offset 开始复制最多 count 字节，返回实际复制的字节数"""
+    if hasattr(os, "copy_file_range"):
+        try:
+            return os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+    if hasattr(os, "sendfile"):
+        try:
+            os.lseek(dst_fd, offset, os.SEEK_SET)
+            return os.sendfile(dst_fd, src_fd, offset, count)
+        except OSError as e:
+            if e.errno not in (errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+    # 兜底：用户态读写
+    data = os.pread(src_fd, min(count, 8 * 1024 * 1024), offset)
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    return os.write(dst_fd, data)
+
+
+def _tail_matches(src_fd: int, partial: Path, size: int) -> bool:
+    """比较 .partial 文件与源文件在 size 之前的最后 VERIFY_SIZE 字节"""
+    start = max(size - VERIFY_SIZE, 0)
+    with open(partial, "rb") as f:
+        f.seek(start)
+        tail = f.read(size - start)
+    return tail == os.pread(src_fd, size - start, start)
+
+
+def _resume_offset(src_fd: int, partial: Path, src_size: int) -> int:
+    """校验已有的 .partial 文件，返回可续传的位置，校验失败返回0"""
+    try:
+        size = partial.stat().st_size
+    except FileNotFoundError:
+        return 0
+    if size > src_size or not _tail_matches(src_fd, partial, size):
+        return 0
+    return size
+
+
+def _same_file_state(src_stat: os.stat_result, dst_stat: os.stat_result) -> bool:
+    """比较大小和修改时间"""
+    return (src_stat.st_size == dst_stat.st_size
+            and abs(src_stat.st_mtime - dst_stat.st_mtime) <= MTIME_TOLERANCE)
+
+
+def copy_file(src: Path, dst: Path, throttle: Optional[Callable[[int], None]] = None) -> int:
+    """
+    复制单个文件，支持从 .partial 续传
+    完成后校验临时文件大小和尾部数据，并确认复制期间源文件未被修改，通过后才同步时间并替换为目标文件
+    throttle 在复制每个数据块前以块大小调用，用于限速
+    返回本次实际复制的字节数
+    """
+    src_stat = os.stat(src)
+    chunk_size = THROTTLE_CHUNK_SIZE if throttle else CHUNK_SIZE
+    partial = dst.with_name(dst.name + PARTIAL_SUFFIX)
+    copied = 0
+    src_fd = os.open(src, os.O_RDONLY)
+    try:
+        offset = _resume_offset(src_fd, partial, src_stat.st_size)
+        dst_fd = os.open(partial, os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(dst_fd, offset)
+            while offset < src_stat.st_size:
+                count = min(chunk_size, src_stat.st_size - offset)
+                if throttle:
+                    throttle(count)
+                count = _kernel_copy(src_fd, dst_fd, offset, count)
+                if count <= 0:
+                    raise IOError(f"复制中断: {src} @ {offset}")
+                offset += count
+                copied += count
+            os.fsync(dst_fd)
+        finally:
+            os.close(dst_fd)
+        # 校验：临时文件大小与源文件一致、尾部数据相同，且复制期间源文件大小和修改时间未变化
+        if (os.stat(partial).st_size != src_stat.st_size
+                or not _tail_matches(src_fd, partial, src_stat.st_size)
+                or not _same_file_state(src_stat, os.stat(src))):
+            raise IOError(f"校验失败: {dst}")
+    finally:
+        os.close(src_fd)
+
+    shutil.copystat(src, partial)
+    os.replace(partial, dst)
+    return copied
+
+
+def clone_file(src: Path, dst: Path) -> int:
+    """使用 FICLONE 克隆文件（btrfs / XFS 等支持 reflink 的文件系统），不复制数据"""
+    if fcntl is None:
+        raise OSError(errno.ENOSYS, "当前系统不支持 reflink")
+    partial = dst.with_name(dst.name + PARTIAL_SUFFIX)
+    try:
+        with open(src, "rb") as src_file, open(partial, "wb") as dst_file:
+            fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+        shutil.copystat(src, partial)
+        os.replace(partial, dst)
+    except OSError:
+        partial.unlink(missing_ok=True)
+        raise
+    return 0
+
+
+def link_file(src: Path, dst: Path) -> int:
+    """创建硬链接，不复制数据"""
+    os.link(src, dst)
+    return 0
+
+
+FILE_METHODS: Dict[str, Callable[[Path, Path], int]] = {
+    "reflink": clone_file,
+    "hardlink": link_file,
+    "copy": copy_file
+}
+
+
+def file_methods(mode: str, same_device: bool) -> List[str]:
+    """根据配置的归档方式和是否同设备，返回逐文件传输时依次尝试的方式"""
+    methods = []
+    if same_device:
+        if mode == "hardlink":
+            methods = ["hardlink", "reflink"]
+        else:
+            methods = ["reflink", "hardlink"]
+    methods.append("copy")
+    return methods
+
+
+def move_tree(source: Path, destination: Path, mode: str = "rename",
+              on_state: Optional[Callable[[str], None]] = None,
+              dedupe: Optional[Callable[[Path, Path], bool]] = None,
+              throttle: Optional[Callable[[int], None]] = None) -> TransferResult:
+    """
+    移动目录树
+    rename 方式且目标不存在时先尝试直接重命名；同设备时依次尝试 reflink / 硬链接，
+    均不支持时逐文件复制并校验，全部完成后删除源目录
+    目标目录中已完成的文件和 .partial 文件会在重试时复用；大小或修改时间不同的已有文件不覆盖，
+    其余文件处理完后抛出 FileExistsError，源目录保留
+    on_state 在开始复制、全部文件校验完成、源目录删除后依次调用，用于记录归档日志
+    dedupe 在需要复制数据的文件上调用，返回 True 表示已按目标目录中的相同文件处理，不再复制
+    throttle 在复制每个数据块前调用，用于限速
+    """
+    def report(state: str):
+        if on_state:
+            on_state(state)
+
+    started = time.monotonic()
+    if mode == "rename" and not destination.exists():
+        try:
+            os.rename(source, destination)
+            report(STATE_REMOVED)
+            return TransferResult(bytes_copied=0, seconds=time.monotonic() - started, method="rename")
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+
+    report(STATE_COPYING)
+
+    methods = file_methods(mode, device_of(source) == device_of(destination.parent))
+    used = set()
+    copied = 0
+    copied_dirs = []
+    # 目标中已有内容不同的同名文件，不覆盖，全部处理完后整体失败并保留源目录
+    conflicts = []
+    for root, dirs, files in os.walk(source):
+        root_path = Path(root)
+        target_root = destination / root_path.relative_to(source)
+        target_root.mkdir(parents=True, exist_ok=True)
+        copied_dirs.append((root_path, target_root))
+        for name in dirs:
+            src_path = root_path / name
+            if src_path.is_symlink():
+                _copy_symlink(src_path, target_root / name)
+        for name in files:
+            src_path = root_path / name
+            if src_path.is_symlink():
+                _copy_symlink(src_path, target_root / name)
+            else:
+                try:
+                    copied += _place_file(src_path, target_root / name, methods, used, dedupe, throttle)
+                except FileExistsError:
+                    conflicts.append(target_root / name)
+
+    if conflicts:
+        names = "、".join(str(path.relative_to(destination)) for path in conflicts[:3])
+        more = f" 等 {len(conflicts)} 个文件" if len(conflicts) > 3 else ""
+        raise FileExistsError(errno.EEXIST, f"目标已存在内容不同的文件，未覆盖，源目录已保留: {names}{more}")
+
+    # 子目录写入完成后再同步目录时间，避免被后续写入覆盖
+    for root_path, target_root in reversed(copied_dirs):
+        shutil.copystat(root_path, target_root)
+    report(STATE_VERIFIED)
+
+    shutil.rmtree(source)
+    report(STATE_REMOVED)
+    return TransferResult(bytes_copied=copied, seconds=time.monotonic() - started,
+                          method="+".join(sorted(used)) or "copy")
+
+
+def _place_file(src: Path, dst: Path, methods: List[str], used: set,
+                dedupe: Optional[Callable[[Path, Path], bool]] = None,
+                throttle: Optional[Callable[[int], None]] = None) -> int:
+    """
+    按顺序尝试各传输方式放置单个文件，不支持的方式会从 methods 中移除，后续文件不再尝试
+    已存在且大小、修改时间一致的目标文件直接跳过，不一致的不覆盖，抛出 FileExistsError；
+    只能复制数据时先尝试按重复文件处理
+    """
+    try:
+        dst_stat = os.stat(dst)
+    except FileNotFoundError:
+        dst_stat = None
+    if dst_stat:
+        if _same_file_state(os.stat(src), dst_stat):
+            return 0
+        raise FileExistsError(errno.EEXIST, f"目标文件已存在: {dst}")
+    if dedupe and methods[0] == "copy" and dedupe(src, dst):
+        used.add(DEDUPE_METHOD)
+        return 0
+    for method in list(methods):
+        try:
+            if method == "copy":
+                copied = copy_file(src, dst, throttle)
+            else:
+                copied = FILE_METHODS[method](src, dst)
+            used.add(method)
+            return copied
+        except OSError as e:
+            if method == "copy" or e.errno not in UNSUPPORTED_ERRNOS:
+                raise
+            methods.remove(method)
+    raise OSError(errno.EIO, f"无法传输文件: {src}")
+
+
+def _copy_symlink(src: Path, dst: Path):
+    """复制软链接本身"""
+    if dst.is_symlink() or dst.exists():
+        return
+    os.symlink(os.readlink(src), dst)
+
+
+def discard_partial(destination: Path, remove_tree: bool):
+    """
+    回滚未完成的目录传输
+    remove_tree 为 True（目标目录由本次传输创建）时删除整个目标目录，否则只删除其中的 .partial 文件
+    """
+    if not destination.exists():
+        return
+    if remove_tree:
+        shutil.rmtree(destination)
+        return
+    for root, _, files in os.walk(destination):
+        for name in files:
+            if name.endswith(PARTIAL_SUFFIX):
+                (Path(root) / name).unlink(missing_ok=True)
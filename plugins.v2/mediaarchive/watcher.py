@@ -0,0 +1,200 @@
+"""
+目录监控
+监听源目录变化（inotify，不可用时轮询），维护待重新计算的目录集合和按可归档时间排序的优先队列，
+只在目录真正达到阈值时触发归档，无需定时全量扫描
+"""
+import heapq
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from watchdog.events import FileSystemEventHandler, FileSystemEvent
+from watchdog.observers import Observer
+from watchdog.observers.polling import PollingObserver
+
+from app.log import logger
+
+# 监控方式
+WATCH_MODES = {
+    "inotify": "实时监控(inotify)",
+    "polling": "轮询监控"
+}
+
+
+class _EventHandler(FileSystemEventHandler):
+    """将文件系统事件转换为候选目录"""
+
+    def __init__(self, watcher: "ArchiveWatcher"):
+        super().__init__()
+        self._watcher = watcher
+
+    def on_any_event(self, event: FileSystemEvent):
+        self._watcher.mark_dirty(event.src_path)
+        dest_path = getattr(event, "dest_path", None)
+        if dest_path:
+            self._watcher.mark_dirty(dest_path)
+
+
+class ArchiveWatcher:
+    """
+    归档监控
+    classify: 将任意路径映射为所属的候选目录，不属于任何候选目录时返回 None
+    eligible_at: 计算候选目录可归档的时间戳，目录不存在或不参与归档时返回 None
+    seed: 启动时返回所有候选目录及其可归档时间
+    archive: 归档到期的候选目录
+    """
+    # 目录最后一次变化后等待的秒数，避免文件仍在写入时反复计算
+    SETTLE_SECONDS = 60
+    # 到期但未被归档（如移动失败）的目录重新检查的间隔
+    RETRY_SECONDS = 3600
+    # 轮询间隔
+    POLLING_INTERVAL = 300
+    # 空闲时最长休眠时间
+    MAX_SLEEP = 3600
+
+    def __init__(self, source_dir: Path, mode: str,
+                 classify: Callable[[Path], Optional[Path]],
+                 eligible_at: Callable[[Path], Optional[float]],
+                 seed: Callable[[], Iterable[Tuple[Path, float]]],
+                 archive: Callable[[List[Path]], None]):
+        self._source_dir = Path(source_dir)
+        self._mode = mode
+        self._classify = classify
+        self._eligible_at = eligible_at
+        self._seed = seed
+        self._archive = archive
+        self._observer = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        # 待重新计算的候选目录 -> 最后一次变化时间
+        self._dirty: Dict[Path, float] = {}
+        # 候选目录 -> 当前有效的可归档时间，与堆中记录不一致的为过期记录
+        self._schedule: Dict[Path, float] = {}
+        self._heap: List[Tuple[float, str]] = []
+
+    def start(self):
+        """启动监控"""
+        self._stop.clear()
+        self._observer = self.__create_observer()
+        self._thread = threading.Thread(target=self.__run, name="mediaarchive-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止监控"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._observer:
+            try:
+                self._observer.stop()
+                self._observer.join(timeout=10)
+            except Exception as e:
+                logger.error(f"停止目录监控失败: {str(e)}")
+            self._observer = None
+        if self._thread:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def mark_dirty(self, path: str):
+        """记录发生变化的路径"""
+        candidate = self._classify(Path(path))
+        if not candidate:
+            return
+        with self._lock:
+            self._dirty[candidate] = time.time()
+        self._wakeup.set()
+
+    def __create_observer(self):
+        """创建文件系统观察者，inotify 启动失败时回退到轮询"""
+        handler = _EventHandler(self)
+        if self._mode == "inotify":
+            try:
+                observer = Observer()
+                observer.schedule(handler, str(self._source_dir), recursive=True)
+                observer.start()
+                logger.info(f"已启动目录实时监控: {self._source_dir}")
+                return observer
+            except Exception as e:
+                logger.warning(f"目录实时监控启动失败，改用轮询监控: {str(e)}")
+        observer = PollingObserver(timeout=self.POLLING_INTERVAL)
+        observer.schedule(handler, str(self._source_dir), recursive=True)
+        observer.start()
+        logger.info(f"已启动目录轮询监控: {self._source_dir}")
+        return observer
+
+    def __schedule(self, directory: Path, eligible_at: Optional[float]):
+        """更新候选目录的可归档时间"""
+        if eligible_at is None:
+            self._schedule.pop(directory, None)
+            return
+        self._schedule[directory] = eligible_at
+        heapq.heappush(self._heap, (eligible_at, str(directory)))
+
+    def __run(self):
+        """监控主循环"""
+        try:
+            for directory, eligible_at in self._seed():
+                if self._stop.is_set():
+                    return
+                self.__schedule(directory, eligible_at)
+            logger.info(f"目录监控初始化完成，共 {len(self._schedule)} 个候选目录")
+        except Exception as e:
+            logger.error(f"目录监控初始化失败: {str(e)}")
+
+        while not self._stop.is_set():
+            try:
+                self.__process_dirty()
+                due = self.__pop_due()
+                if due:
+                    self._archive(due)
+                    # 归档后目录仍存在的（未满足条件或移动失败），稍后重新检查
+                    retry_at = time.time() + self.RETRY_SECONDS
+                    for directory in due:
+                        if directory.exists():
+                            eligible_at = self._eligible_at(directory)
+                            if eligible_at is not None:
+                                self.__schedule(directory, max(eligible_at, retry_at))
+            except Exception as e:
+                logger.error(f"目录监控处理出错: {str(e)}")
+            self._wakeup.wait(self.__sleep_seconds())
+            self._wakeup.clear()
+
+    def __process_dirty(self):
+        """重新计算已稳定的变化目录"""
+        now = time.time()
+        with self._lock:
+            settled = [path for path, changed in self._dirty.items() if now - changed >= self.SETTLE_SECONDS]
+            for path in settled:
+                del self._dirty[path]
+        for directory in settled:
+            self.__schedule(directory, self._eligible_at(directory))
+
+    def __pop_due(self) -> List[Path]:
+        """取出已到期的候选目录"""
+        now = time.time()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            eligible_at, path = heapq.heappop(self._heap)
+            directory = Path(path)
+            if self._schedule.get(directory) != eligible_at:
+                continue
+            with self._lock:
+                # 仍在变化中的目录等稳定后再计算
+                if directory in self._dirty:
+                    continue
+            del self._schedule[directory]
+            due.append(directory)
+        return due
+
+    def __sleep_seconds(self) -> float:
+        """计算下一次需要唤醒的时间"""
+        now = time.time()
+        wake_at = now + self.MAX_SLEEP
+        if self._heap:
+            wake_at = min(wake_at, self._heap[0][0])
+        with self._lock:
+            if self._dirty:
+                wake_at = min(wake_at, min(self._dirty.values()) + self.SETTLE_SECONDS)
+        return max(wake_at - now, 1)